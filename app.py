@@ -1,13 +1,47 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, send_from_directory, g, has_app_context
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from calendar import monthrange
 import sqlite3
 import os
+import sys
+import zlib
+import gzip
+import hashlib
+import mimetypes
+import json
+import csv
+import io
+import base64
+import html
+import secrets
+import queue
+import threading
+import time
 import atexit
-from functools import wraps
+import signal
+import click
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps, lru_cache
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from werkzeug.serving import make_server
+
+try:
+    import orjson
+except ImportError:  # Optional faster JSON encoder; the standard library is used without it
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional; without it static assets are only precompressed with gzip
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # No flock on Windows; only single-process serving is supported there
+    fcntl = None
 
 app = Flask(__name__)
 # Use a fixed secret key for sessions (in production, use environment variable)
@@ -22,16 +56,77 @@ else:
 # Configure permanent session lifetime to 7 days
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
 DATABASE = 'tasks.db'
+# Seconds a writer waits for another connection's lock before "database is locked"
+DB_BUSY_TIMEOUT = 5
+# Per-connection page cache (negative = KiB) and memory-mapped I/O size
+DB_CACHE_SIZE_KB = 8192
+DB_MMAP_SIZE = 64 * 1024 * 1024
+
+class SharedConnection(sqlite3.Connection):
+    """sqlite3 connection that is shared by everything handling one request"""
+    shared = False
+    # Set once anything in the request asked for a connection it may write through
+    writable = False
+    
+    def close(self):
+        # A helper closing the shared connection must not end the handler's transaction;
+        # the teardown closes it, discarding whatever was not committed
+        if not self.shared:
+            super().close()
 
-def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
+def connect_db():
+    """Open a new database connection with the app's PRAGMAs applied"""
+    conn = sqlite3.connect(DATABASE, timeout=DB_BUSY_TIMEOUT, factory=SharedConnection)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute(f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
     return conn
 
+def get_db(readonly=False):
+    """Get database connection
+    
+    Inside a request the same connection is returned on every call and closed on
+    teardown. Background jobs get their own connection and must close it.
+    """
+    if has_app_context():
+        conn = g.get('db')
+        if conn is None:
+            conn = g.db = connect_db()
+            conn.shared = True
+    else:
+        conn = connect_db()
+    if not readonly:
+        conn.writable = True
+    # Read endpoints must never write, so they never take SQLite's write lock. A helper
+    # reading in the middle of a write handler leaves the connection writable
+    conn.execute(f'PRAGMA query_only = {"OFF" if conn.writable else "ON"}')
+    return conn
+
+@app.teardown_appcontext
+def close_db(exception):
+    """Close the request's database connection"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.shared = False
+        conn.close()
+
+def create_index(conn, name, table, columns):
+    """Create an index, replacing one of the same name that was created with other columns"""
+    existing = [row[2] for row in conn.execute(f'PRAGMA index_info({name})').fetchall()]
+    if existing and existing != list(columns):
+        conn.execute(f'DROP INDEX {name}')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table}({", ".join(columns)})')
+
 def init_db():
     """Initialize database with tables"""
     conn = get_db()
+    migrate_instances = False
+    
+    # WAL lets readers proceed while the scheduler or another user is writing;
+    # the journal mode is stored in the database file, so this only needs to run here
+    conn.execute('PRAGMA journal_mode = WAL')
     
     # Tasks table
     conn.execute('''
@@ -78,6 +173,12 @@ def init_db():
             conn.execute('ALTER TABLE tasks ADD COLUMN parent_task_id INTEGER')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_parent_task_id ON tasks(parent_task_id)')
         
+        if 'occurrence_date' not in columns:
+            # Recurring tasks now keep only the rule on the parent plus sparse overrides
+            conn.execute('ALTER TABLE tasks ADD COLUMN occurrence_date TEXT')
+            conn.execute('ALTER TABLE tasks ADD COLUMN cancelled INTEGER DEFAULT 0')
+            migrate_instances = True
+        
         conn.commit()
     except sqlite3.OperationalError:
         # Columns already exist, ignore
@@ -90,10 +191,24 @@ def init_db():
             username TEXT UNIQUE NOT NULL,
             password_hash TEXT NOT NULL,
             is_admin INTEGER DEFAULT 0,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            role_version INTEGER DEFAULT 0,
+            calendar_token TEXT
         )
     ''')
     
+    # Bumped on every role change so sessions can tell their cached role is stale
+    user_columns = [row[1] for row in conn.execute("PRAGMA table_info(users)").fetchall()]
+    if 'role_version' not in user_columns:
+        conn.execute('ALTER TABLE users ADD COLUMN role_version INTEGER DEFAULT 0')
+        conn.commit()
+    
+    # Secret in the URL of the user's calendar feed, created when they first ask for one
+    if 'calendar_token' not in user_columns:
+        conn.execute('ALTER TABLE users ADD COLUMN calendar_token TEXT')
+        conn.commit()
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_calendar_token ON users(calendar_token)')
+    
     # Account requests table
     conn.execute('''
         CREATE TABLE IF NOT EXISTS account_requests (
@@ -131,276 +246,867 @@ def init_db():
     
     # Create index for faster lookups
     conn.execute('CREATE INDEX IF NOT EXISTS idx_checklist_task_id ON checklist_items(task_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_completion_requests_task_id ON task_completion_requests(task_id)')
+    
+    # Indexes backing the task list queries and the visibility predicates; the list
+    # indexes hold the lists' exact sort order so a page is read without sorting
+    create_index(conn, 'idx_tasks_list', 'tasks', ('completed', 'parent_task_id', 'date', 'time', 'created_at', 'id'))
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_assigned_to ON tasks(assigned_to)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_created_by_visibility ON tasks(created_by, visibility)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_is_admin ON users(is_admin)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_date ON tasks(date, completed)')
+    # Orders the completed list, and lets the retention job find expired tasks without a scan
+    create_index(conn, 'idx_tasks_completed_at', 'tasks', ('completed', 'completed_at', 'id'))
+    # The completed list pages on completed_at, so completed tasks must have one
+    conn.execute('UPDATE tasks SET completed_at = created_at WHERE completed = 1 AND completed_at IS NULL')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_completion_requests_requested_at ON task_completion_requests(requested_at)')
+    
+    # Foreign keys are enforced now; completion requests have no ON DELETE CASCADE,
+    # so remove them together with their task
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_completion_requests
+        BEFORE DELETE ON tasks
+        BEGIN
+            DELETE FROM task_completion_requests WHERE task_id = OLD.id;
+        END
+    ''')
     
-    conn.commit()
-    conn.close()
-
-def calculate_recurring_dates(start_date_str, recurrence, end_date):
-    """Calculate all recurring dates from start_date up to end_date"""
-    if not start_date_str or not recurrence:
-        return []
+    # Data version counter, bumped by triggers on every change the read endpoints depend on
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+    for table in ('tasks', 'checklist_items', 'users', 'task_completion_requests'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_data_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_version SET version = version + 1 WHERE id = 1;
+                END
+            ''')
+    
+    # Append-only change log for delta sync; deletes are logged as tombstones and
+    # checklist changes are logged against their task
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            operation TEXT NOT NULL,
+            changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log(changed_at)')
+    for table, task_column in (('tasks', 'id'), ('checklist_items', 'task_id')):
+        for event, row, operation in (('INSERT', 'NEW', 'upsert'), ('UPDATE', 'NEW', 'upsert'), ('DELETE', 'OLD', 'delete')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_change_log
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO change_log (table_name, row_id, task_id, operation)
+                    VALUES ('{table}', {row}.id, {row}.{task_column}, '{operation}');
+                END
+            ''')
+    
+    # Full-text index over task text and each task's checklist items (rowid = task id),
+    # kept current by triggers; the checklist column is rebuilt for the task on any item change
+    search_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'task_search'"
+    ).fetchone()
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5(
+            task, checklist, tokenize = 'unicode61 remove_diacritics 2'
+        )
+    ''')
+    refresh_search_row = '''
+        DELETE FROM task_search WHERE rowid = {task_id};
+        INSERT INTO task_search (rowid, task, checklist)
+        SELECT id, task, (SELECT group_concat(item_text, ' ') FROM checklist_items WHERE task_id = tasks.id)
+        FROM tasks WHERE id = {task_id};
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_search AFTER INSERT ON tasks
+        BEGIN {refresh_search_row.format(task_id='NEW.id')} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_update_search AFTER UPDATE OF task ON tasks
+        BEGIN {refresh_search_row.format(task_id='NEW.id')} END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_search AFTER DELETE ON tasks
+        BEGIN DELETE FROM task_search WHERE rowid = OLD.id; END
+    ''')
+    for event, row in (('INSERT', 'NEW'), ('UPDATE OF item_text, task_id', 'NEW'), ('DELETE', 'OLD')):
+        name = event.split()[0].lower()
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_checklist_items_{name}_search AFTER {event} ON checklist_items
+            BEGIN {refresh_search_row.format(task_id=f'{row}.task_id')} END
+        ''')
+    if not search_exists:
+        conn.execute('''
+            INSERT INTO task_search (rowid, task, checklist)
+            SELECT id, task, (SELECT group_concat(item_text, ' ') FROM checklist_items WHERE task_id = tasks.id)
+            FROM tasks
+        ''')
     
-    try:
-        start_date = datetime.fromisoformat(start_date_str.split('T')[0])
-    except:
-        # Handle date string format YYYY-MM-DD
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+    # Responses of writes sent with an Idempotency-Key, replayed when the write is retried
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            user_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            status_code INTEGER NOT NULL,
+            response_body TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, key)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys(created_at)')
     
-    dates = []
-    current_date = start_date
-    original_day = start_date.day  # Store the original day to always try it first
+    # Completed tasks past retention, moved out of tasks so the hot queries stay small.
+    # Rows keep their task id and carry their checklist as JSON; there are no foreign
+    # keys, the user delete removes a user's archived tasks itself
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            id INTEGER PRIMARY KEY,
+            task TEXT NOT NULL,
+            date TEXT,
+            time TEXT,
+            completed INTEGER DEFAULT 0,
+            completed_at TEXT,
+            created_at TEXT,
+            user_id INTEGER,
+            created_by INTEGER,
+            visibility TEXT DEFAULT 'all',
+            assigned_to INTEGER,
+            recurrence TEXT,
+            parent_task_id INTEGER,
+            occurrence_date TEXT,
+            cancelled INTEGER DEFAULT 0,
+            checklist TEXT,
+            archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_archive_completed_at ON tasks_archive(completed_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_archive_created_by ON tasks_archive(created_by)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_archive_assigned_to ON tasks_archive(assigned_to)')
     
-    while current_date <= end_date:
-        dates.append(current_date.strftime('%Y-%m-%d'))
-        
-        if recurrence == 'daily':
-            current_date += timedelta(days=1)
-        elif recurrence == 'weekly':
-            current_date += timedelta(weeks=1)
-        elif recurrence == 'bi-weekly':
-            current_date += timedelta(weeks=2)
-        elif recurrence == 'monthly':
-            # Add one month, always try original day first, fall back to last day if needed
-            if current_date.month == 12:
-                next_month = 1
-                next_year = current_date.year + 1
-            else:
-                next_month = current_date.month + 1
-                next_year = current_date.year
-            
-            # Always try the original day first (e.g., 31st)
-            try:
-                current_date = current_date.replace(year=next_year, month=next_month, day=original_day)
-            except ValueError:
-                # Day doesn't exist in target month, use last day of that month
-                last_day = monthrange(next_year, next_month)[1]
-                current_date = current_date.replace(year=next_year, month=next_month, day=last_day)
-        elif recurrence == 'yearly':
-            # For yearly, also handle Feb 29 -> Feb 28 in non-leap years
-            try:
-                current_date = current_date.replace(year=current_date.year + 1, day=original_day)
-            except ValueError:
-                # Leap year edge case: Feb 29 -> Feb 28 in non-leap year
-                current_date = current_date.replace(year=current_date.year + 1, day=28)
-        else:
-            break
+    # Repair references left dangling while foreign keys were not enforced
+    conn.execute('DELETE FROM checklist_items WHERE task_id NOT IN (SELECT id FROM tasks)')
+    conn.execute('''
+        DELETE FROM task_completion_requests
+        WHERE task_id NOT IN (SELECT id FROM tasks) OR requested_by NOT IN (SELECT id FROM users)
+    ''')
+    for column in ('user_id', 'created_by', 'assigned_to'):
+        conn.execute(f'''
+            UPDATE tasks SET {column} = NULL
+            WHERE {column} IS NOT NULL AND {column} NOT IN (SELECT id FROM users)
+        ''')
+    
+    if migrate_instances:
+        migrate_materialized_instances(conn)
+    
+    # At most one override row per occurrence, so concurrent requests can't duplicate them
+    has_unique_index = conn.execute('''
+        SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_occurrence_unique'
+    ''').fetchone()
+    if not has_unique_index:
+        # Older instance rows may share an occurrence date (e.g. one moved onto another);
+        # keep the first as the override and detach the rest as plain rows of the series
+        conn.execute('''
+            UPDATE tasks SET occurrence_date = NULL
+            WHERE occurrence_date IS NOT NULL AND id NOT IN (
+                SELECT MIN(id) FROM tasks
+                WHERE occurrence_date IS NOT NULL
+                GROUP BY parent_task_id, occurrence_date
+            )
+        ''')
+        conn.execute('DROP INDEX IF EXISTS idx_occurrence')
+        conn.execute('CREATE UNIQUE INDEX idx_occurrence_unique ON tasks(parent_task_id, occurrence_date)')
     
-    return dates
+    conn.commit()
+    conn.close()
 
-def generate_recurring_instances(conn, parent_task_id, start_date_str, recurrence, time_str, 
-                                user_id, created_by, visibility, assigned_to, end_date):
-    """Generate recurring task instances from start_date up to end_date"""
-    if not recurrence or not start_date_str:
-        return
+# Visibility predicates for task queries. They expect the task table aliased as t,
+# joined to its creator as u and to its assignee as u2 (see TASK_USER_JOINS), so the
+# role checks are primary-key lookups instead of IN (SELECT ... FROM users) scans.
+TASK_USER_JOINS = '''
+    LEFT JOIN users u ON t.created_by = u.id
+    LEFT JOIN users u2 ON t.assigned_to = u2.id
+'''
+
+# Admins see: 
+# - Tasks with visibility='all' or 'admins' and not assigned (assigned to all users/admins)
+# - Tasks assigned to non-admins
+# - Tasks assigned to admins that are NOT private (visibility != 'private')
+# - Their own private tasks (visibility='private' AND created_by = user_id)
+# - All tasks created by regular users (to ensure admin oversight)
+ADMIN_VISIBILITY_FILTER = '''
+    ((t.visibility IN ('all', 'admins') AND t.assigned_to IS NULL) OR
+     u2.is_admin = 0 OR
+     (u2.is_admin = 1 AND t.visibility != 'private') OR
+     (t.visibility = 'private' AND t.created_by = ?) OR
+     u.is_admin = 0)
+'''
+
+# Regular users see: 
+# - Tasks with visibility='all' that are not assigned to anyone (global tasks created by admins)
+# - Tasks assigned to them
+# - Tasks they created (their own tasks)
+# They should NOT see tasks created by other non-admins unless assigned to them
+# Note: Tasks created by non-admins have assigned_to = created_by, so they won't match the first condition
+USER_VISIBILITY_FILTER = '''
+    ((t.visibility = 'all' AND t.assigned_to IS NULL AND u.is_admin = 1) OR 
+     t.assigned_to = ? OR 
+     (t.created_by = ? AND t.visibility != 'admins'))
+'''
+
+# Per-task checklist counts, computed with one grouped join instead of a request per task
+CHECKLIST_SUMMARY_COLUMNS = ''',
+    COALESCE(cl.checklist_total, 0) as checklist_total,
+    COALESCE(cl.checklist_completed, 0) as checklist_completed
+'''
+CHECKLIST_SUMMARY_JOIN = '''
+    LEFT JOIN (
+        SELECT task_id, COUNT(*) as checklist_total, SUM(completed) as checklist_completed
+        FROM checklist_items
+        GROUP BY task_id
+    ) cl ON cl.task_id = t.id
+'''
+
+def get_checklist_summary_sql():
+    """Get the (columns, join) SQL fragments for checklist counts if the request asked for them"""
+    if request.args.get('checklist_summary', 'false').lower() == 'true':
+        return CHECKLIST_SUMMARY_COLUMNS, CHECKLIST_SUMMARY_JOIN
+    return '', ''
+
+# Change log entries older than this are pruned; clients further behind do a full reload
+CHANGE_LOG_RETENTION_DAYS = 7
+# Above this many changed tasks a full reload is cheaper than a delta
+SYNC_MAX_CHANGES = 500
+
+def get_sync_cursor(conn):
+    """Get the id of the latest change log entry"""
+    latest = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return latest['seq'] if latest else 0
+
+# Largest page /api/tasks returns when a client pages through the list
+TASK_PAGE_MAX = 500
+# Columns a client may ask for with ?fields= on the task list
+TASK_FIELDS = frozenset((
+    'id', 'task', 'date', 'time', 'completed', 'completed_at', 'created_at', 'user_id',
+    'created_by', 'visibility', 'assigned_to', 'recurrence', 'parent_task_id',
+    'occurrence_date', 'cancelled', 'creator_username', 'assigned_to_username',
+    'has_pending_request', 'checklist_total', 'checklist_completed',
+))
+
+# Rows serialized per chunk of a streamed JSON array or JSON Lines body
+JSON_STREAM_BATCH = 100
+
+def dumps_json(value):
+    """Serialize a value to compact JSON text, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value, separators=(',', ':'))
+
+def stream_json_array(rows, transform=dict):
+    """Yield a JSON array of rows a batch at a time as they are read"""
+    yield '['
+    separator = ''
+    batch = []
+    for row in rows:
+        batch.append(dumps_json(transform(row)))
+        if len(batch) >= JSON_STREAM_BATCH:
+            yield separator + ','.join(batch)
+            separator = ','
+            batch = []
+    if batch:
+        yield separator + ','.join(batch)
+    yield ']'
+
+def stream_json_lines(rows, transform=dict):
+    """Yield rows as JSON Lines, a batch at a time as they are read"""
+    batch = []
+    for row in rows:
+        batch.append(dumps_json(transform(row)) + '\n')
+        if len(batch) >= JSON_STREAM_BATCH:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+def stream_read_only_response(generate, mimetype, headers=None):
+    """Stream a response body produced by generate(conn) from a database connection.
+    
+    The request's shared connection is closed before a streamed body is sent, so
+    the body is read through a read-only connection of the response's own.
+    """
+    def body():
+        conn = connect_db()
+        try:
+            conn.execute('PRAGMA query_only = ON')
+            yield from generate(conn)
+        finally:
+            conn.close()
+    return Response(body(), mimetype=mimetype, headers=headers)
+
+def stream_query_json(query, params, transform=dict):
+    """Stream the rows of a read query as a JSON array response"""
+    return stream_read_only_response(
+        lambda conn: stream_json_array(conn.execute(query, params), transform), 'application/json')
+
+def encode_page_cursor(values):
+    """Encode the sort key of a page's last task as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_page_cursor(cursor, length):
+    """Decode a page cursor into its sort key values, or None if it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
+
+def keyset_after(columns, values, seek=True):
+    """Predicate and parameters for the rows after a cursor, in ascending order of columns.
+    
+    NULL sorts first, as in SQLite's ORDER BY and indexes; equality uses IS so it
+    matches NULL too. With seek, a bound on the first column lets the index seek
+    to the cursor.
+    """
+    column, value = columns[0], values[0]
+    if value is None:
+        greater, params = f'{column} IS NOT NULL', ()
+    else:
+        greater, params = f'{column} > ?', (value,)
+    if len(columns) > 1:
+        rest, rest_params = keyset_after(columns[1:], values[1:], seek=False)
+        greater = f'({greater} OR ({column} IS ? AND {rest}))'
+        params = params + (value,) + rest_params
+    if seek and value is not None:
+        return f'{column} >= ? AND {greater}', (value,) + params
+    return greater, params
+
+@lru_cache(maxsize=256)
+def get_visibility_filter(is_admin, user_id):
+    """Get the visibility predicate and its parameters for a user"""
+    if is_admin:
+        return ADMIN_VISIBILITY_FILTER, (user_id,)
+    return USER_VISIBILITY_FILTER, (user_id, user_id)
+
+# Recurrences with a fixed length in days, and those stepping whole months
+# (day of month kept, clamped to the month's last day when it is shorter)
+RECURRENCE_DAY_STEPS = {'daily': 1, 'weekly': 7, 'bi-weekly': 14}
+RECURRENCE_MONTH_STEPS = {'monthly': 1, 'yearly': 12}
+
+def parse_task_date(date_str):
+    """Parse a task's date (YYYY-MM-DD, optionally with a time part) to midnight"""
+    return datetime.strptime(date_str.split('T')[0], '%Y-%m-%d')
+
+def month_index(day):
+    """Months since year 0, so month arithmetic is plain integer arithmetic"""
+    return day.year * 12 + day.month - 1
+
+def nth_occurrence(start_date, recurrence, n):
+    """Date of occurrence n of a series (0 is the start date itself), in constant time"""
+    if recurrence in RECURRENCE_DAY_STEPS:
+        return datetime.fromordinal(start_date.toordinal() + n * RECURRENCE_DAY_STEPS[recurrence])
+    year, month = divmod(month_index(start_date) + n * RECURRENCE_MONTH_STEPS[recurrence], 12)
+    month += 1
+    return datetime(year, month, min(start_date.day, monthrange(year, month)[1]))
+
+def occurrence_range(start_date, recurrence, window_start, window_end):
+    """Indices n of the occurrences falling within [window_start, window_end]"""
+    if recurrence in RECURRENCE_DAY_STEPS:
+        step = RECURRENCE_DAY_STEPS[recurrence]
+        first = -((start_date.toordinal() - window_start.toordinal()) // step)
+        last = (window_end.toordinal() - start_date.toordinal()) // step
+    else:
+        # Occurrence n always falls in month start + n * step, so locate the months
+        # first and then check the clamped day at each end of the window
+        step = RECURRENCE_MONTH_STEPS[recurrence]
+        first = -((month_index(start_date) - month_index(window_start)) // step)
+        if nth_occurrence(start_date, recurrence, first) < window_start:
+            first += 1
+        last = (month_index(window_end) - month_index(start_date)) // step
+        if nth_occurrence(start_date, recurrence, last) > window_end:
+            last -= 1
+    return range(max(first, 0), last + 1)
+
+def calculate_recurring_dates(start_date_str, recurrence, end_date, window_start=None):
+    """Calculate the recurring dates from start_date (or window_start, if later) up to end_date.
     
-    # Get the parent task details
-    parent_task = conn.execute('SELECT * FROM tasks WHERE id = ?', (parent_task_id,)).fetchone()
-    if not parent_task:
-        return
+    Only the occurrences inside the window are computed, so the cost does not depend
+    on how long ago the series started.
+    """
+    if not start_date_str or not recurrence:
+        return []
     
-    dates = calculate_recurring_dates(start_date_str, recurrence, end_date)
+    start_date = parse_task_date(start_date_str)
+    # Compare whole days so a window bound with a time of day still includes its date
+    window_end = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    window_start = window_start.replace(hour=0, minute=0, second=0, microsecond=0) if window_start else start_date
+    
+    if recurrence not in RECURRENCE_DAY_STEPS and recurrence not in RECURRENCE_MONTH_STEPS:
+        # Unknown rules only ever produce the start date itself
+        in_window = window_start <= start_date <= window_end
+        return [start_date.strftime('%Y-%m-%d')] if in_window else []
+    return [nth_occurrence(start_date, recurrence, n).strftime('%Y-%m-%d')
+            for n in occurrence_range(start_date, recurrence, window_start, window_end)]
+
+# Recurring occurrences older than this are not expanded, and their overrides are archived or dropped
+RECURRENCE_HISTORY_DAYS = 90
+# Default look-ahead when a read endpoint does not ask for a specific window
+RECURRENCE_HORIZON_DAYS = 365
+
+def get_occurrence_dates(parent_task, start_date, end_date):
+    """Get the occurrence dates of a recurring parent task within [start_date, end_date].
     
-    # Skip the first date (it's the original task)
-    if len(dates) > 1:
-        for date_str in dates[1:]:
-            # Check if instance already exists for this date
-            existing = conn.execute('''
-                SELECT id FROM tasks 
-                WHERE parent_task_id = ? AND date = ?
-            ''', (parent_task_id, date_str)).fetchone()
-            
-            if not existing:
-                conn.execute('''
-                    INSERT INTO tasks (task, date, time, user_id, created_by, visibility, 
-                                     assigned_to, recurrence, parent_task_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (parent_task['task'], date_str, time_str, user_id, created_by, 
-                      visibility, assigned_to, recurrence, parent_task_id))
-
-def ensure_recurring_instances_exist(conn, task_id, target_date_str=None):
-    """Ensure recurring instances exist up to target_date (default: 1 year from now)"""
-    task = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
-    if not task or not task['recurrence'] or not task['date']:
-        return
+    The parent row itself is the first occurrence, so its own date is never included.
+    """
+    if not parent_task['recurrence'] or not parent_task['date']:
+        return []
+    dates = calculate_recurring_dates(parent_task['date'], parent_task['recurrence'], end_date, start_date)
+    series_start = parent_task['date'].split('T')[0]
+    return [d for d in dates if d != series_start]
+
+def get_expansion_window(start_date, end_date):
+    """Clamp a requested date window to the range recurring tasks are expanded for"""
+    history_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=RECURRENCE_HISTORY_DAYS)
+    return max(start_date, history_start), end_date
+
+def expand_recurring_tasks(conn, visibility_filter, params, start_date, end_date):
+    """Expand visible recurring tasks into virtual occurrences for a date window.
+    
+    Only the rule lives on the parent row. Occurrences that were completed, moved or
+    deleted have an override row (parent_task_id + occurrence_date) and are returned
+    by the regular task queries instead, so they are skipped here.
+    """
+    start_date, end_date = get_expansion_window(start_date, end_date)
+    if start_date > end_date:
+        return []
+    start_str = start_date.strftime('%Y-%m-%d')
+    end_str = end_date.strftime('%Y-%m-%d')
     
-    # If this is already an instance, get the parent
-    parent_id = task['parent_task_id'] if task['parent_task_id'] else task_id
-    parent_task = conn.execute('SELECT * FROM tasks WHERE id = ?', (parent_id,)).fetchone()
-    if not parent_task:
-        return
+    parents = conn.execute(f'''
+        SELECT t.*, u.username as creator_username, u2.username as assigned_to_username
+        FROM tasks t
+        {TASK_USER_JOINS}
+        WHERE t.parent_task_id IS NULL AND t.recurrence IS NOT NULL
+          AND t.date IS NOT NULL AND t.date <= ? AND ({visibility_filter})
+    ''', (end_str,) + tuple(params)).fetchall()
+    if not parents:
+        return []
     
-    # Determine end date
-    if target_date_str:
-        try:
-            end_date = datetime.strptime(target_date_str, '%Y-%m-%d')
-        except:
-            end_date = datetime.now() + timedelta(days=365)
-    else:
-        end_date = datetime.now() + timedelta(days=365)
-    
-    # Check what's the latest instance date (including parent if it's later)
-    latest_instance = conn.execute('''
-        SELECT MAX(date) as max_date FROM tasks 
-        WHERE (parent_task_id = ? OR id = ?) AND date IS NOT NULL
-    ''', (parent_id, parent_id)).fetchone()
-    
-    latest_date = None
-    if latest_instance and latest_instance['max_date']:
-        latest_date = datetime.strptime(latest_instance['max_date'], '%Y-%m-%d')
-    
-    # If we need more instances, generate them
-    if not latest_date or latest_date < end_date:
-        parent_date = datetime.strptime(parent_task['date'], '%Y-%m-%d')
-        recurrence = parent_task['recurrence']
+    overridden = set()
+    rows = conn.execute('''
+        SELECT parent_task_id, occurrence_date FROM tasks
+        WHERE parent_task_id IS NOT NULL AND occurrence_date BETWEEN ? AND ?
+    ''', (start_str, end_str)).fetchall()
+    for row in rows:
+        overridden.add((row['parent_task_id'], row['occurrence_date']))
+    
+    occurrences = []
+    for parent in parents:
+        for date_str in get_occurrence_dates(parent, start_date, end_date):
+            if (parent['id'], date_str) in overridden:
+                continue
+            occurrence = dict(parent)
+            occurrence.update({
+                'id': None,
+                'parent_task_id': parent['id'],
+                'date': date_str,
+                'occurrence_date': date_str,
+                'completed': 0,
+                'completed_at': None,
+                'has_pending_request': 0,
+                'is_virtual': 1
+            })
+            occurrences.append(occurrence)
+    return occurrences
+
+def materialize_occurrences(conn, parent_task, occurrence_dates, **overrides):
+    """Create override rows for occurrences of a recurring task in a single batch.
+    
+    Occurrences that already have a row are skipped by the unique
+    (parent_task_id, occurrence_date) index.
+    """
+    row = {
+        'task': parent_task['task'],
+        'time': parent_task['time'],
+        'user_id': parent_task['user_id'],
+        'created_by': parent_task['created_by'],
+        'visibility': parent_task['visibility'],
+        'assigned_to': parent_task['assigned_to'],
+        'recurrence': parent_task['recurrence'],
+        'parent_task_id': parent_task['id'],
+        'completed': 0,
+        'completed_at': None,
+        'cancelled': 0
+    }
+    row.update(overrides)
+    columns = ', '.join(['date', 'occurrence_date'] + list(row.keys()))
+    placeholders = ', '.join('?' for _ in range(len(row) + 2))
+    values = tuple(row.values())
+    conn.executemany(f'INSERT OR IGNORE INTO tasks ({columns}) VALUES ({placeholders})',
+                     [(date_str, date_str) + values for date_str in occurrence_dates])
+
+def materialize_occurrence(conn, parent_task, occurrence_date, **overrides):
+    """Create the override row for one occurrence of a recurring task and return its id"""
+    materialize_occurrences(conn, parent_task, [occurrence_date], **overrides)
+    existing = conn.execute('''
+        SELECT id FROM tasks 
+        WHERE parent_task_id = ? AND occurrence_date = ?
+    ''', (parent_task['id'], occurrence_date)).fetchone()
+    return existing['id']
+
+def migrate_materialized_instances(conn):
+    """Convert instance rows generated by the old materializing engine into sparse overrides.
+    
+    Instances identical to what the rule would produce are dropped, and gaps left by
+    deleted instances are recorded as cancelled overrides so they don't reappear.
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    history_start = (today - timedelta(days=RECURRENCE_HISTORY_DAYS)).strftime('%Y-%m-%d')
+    conn.execute('UPDATE tasks SET occurrence_date = date WHERE parent_task_id IS NOT NULL')
+    
+    parents = conn.execute('''
+        SELECT * FROM tasks 
+        WHERE recurrence IS NOT NULL AND parent_task_id IS NULL AND date IS NOT NULL
+    ''').fetchall()
+    for parent in parents:
+        instances = conn.execute('''
+            SELECT t.id, t.date, t.completed,
+                   EXISTS (SELECT 1 FROM checklist_items ci WHERE ci.task_id = t.id) as has_checklist,
+                   EXISTS (SELECT 1 FROM task_completion_requests tcr WHERE tcr.task_id = t.id) as has_requests
+            FROM tasks t
+            WHERE t.parent_task_id = ? AND t.date IS NOT NULL
+        ''', (parent['id'],)).fetchall()
+        if not instances:
+            continue
         
-        # Calculate the next occurrence date based on the recurrence pattern
-        original_day = parent_date.day  # Always use the original day from parent task
+        latest_date = datetime.strptime(max(i['date'] for i in instances), '%Y-%m-%d')
+        schedule = set(calculate_recurring_dates(parent['date'], parent['recurrence'], latest_date)[1:])
         
-        if latest_date:
-            # Find the next occurrence after latest_date based on the pattern
-            next_date = latest_date
-            while next_date <= latest_date:
-                if recurrence == 'daily':
-                    next_date += timedelta(days=1)
-                elif recurrence == 'weekly':
-                    next_date += timedelta(weeks=1)
-                elif recurrence == 'bi-weekly':
-                    next_date += timedelta(weeks=2)
-                elif recurrence == 'monthly':
-                    # Add one month, always try original day first, fall back to last day if needed
-                    if next_date.month == 12:
-                        next_month = 1
-                        next_year = next_date.year + 1
-                    else:
-                        next_month = next_date.month + 1
-                        next_year = next_date.year
-                    
-                    # Always try the original day first (e.g., 31st)
-                    try:
-                        next_date = next_date.replace(year=next_year, month=next_month, day=original_day)
-                    except ValueError:
-                        # Day doesn't exist in target month, use last day of that month
-                        last_day = monthrange(next_year, next_month)[1]
-                        next_date = next_date.replace(year=next_year, month=next_month, day=last_day)
-                elif recurrence == 'yearly':
-                    # For yearly, also handle Feb 29 -> Feb 28 in non-leap years
-                    try:
-                        next_date = next_date.replace(year=next_date.year + 1, day=original_day)
-                    except ValueError:
-                        # Leap year edge case: Feb 29 -> Feb 28 in non-leap year
-                        next_date = next_date.replace(year=next_date.year + 1, day=28)
-                else:
-                    break
-            start_gen_date = next_date
-        else:
-            # First time generating - start from parent date
-            start_gen_date = parent_date
+        pristine = [(i['id'],) for i in instances
+                    if i['date'] in schedule and not i['completed']
+                    and not i['has_checklist'] and not i['has_requests']]
+        conn.executemany('DELETE FROM tasks WHERE id = ?', pristine)
         
-        # Only generate if start date is before or equal to end date
-        if start_gen_date <= end_date:
-            # Use calculate_recurring_dates to get all dates from start_gen_date to end_date
-            # This ensures we generate all months correctly
-            dates = calculate_recurring_dates(start_gen_date.strftime('%Y-%m-%d'), recurrence, end_date)
-            
-            # Get existing instance dates to avoid duplicates
-            existing_dates = set()
-            existing = conn.execute('''
-                SELECT date FROM tasks 
-                WHERE parent_task_id = ? AND date IS NOT NULL
-            ''', (parent_id,)).fetchall()
-            for row in existing:
-                existing_dates.add(row['date'])
-            
-            # Insert missing dates
-            # Include all dates from calculate_recurring_dates, but skip if they already exist
-            # Note: start_gen_date is the next date after latest_date, so we want to include it
-            for date_str in dates:
-                if date_str not in existing_dates:
-                    conn.execute('''
-                        INSERT INTO tasks (task, date, time, user_id, created_by, visibility, 
-                                         assigned_to, recurrence, parent_task_id)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (parent_task['task'], date_str, 
-                          parent_task['time'] if parent_task['time'] else None,
-                          parent_task['user_id'], parent_task['created_by'],
-                          parent_task['visibility'], parent_task['assigned_to'],
-                          recurrence, parent_id))
+        seen = set(i['date'] for i in instances)
+        gaps = sorted(d for d in schedule - seen if d >= history_start)
+        materialize_occurrences(conn, parent, gaps, cancelled=1)
 
 def extend_recurring_instances_job():
-    """Weekly job to extend recurring task instances that are expiring soon and clean up old instances"""
+    """Weekly job to clean up override rows of recurring tasks that are too old to be shown"""
+    started = time.perf_counter()
     conn = get_db()
     try:
-        now = datetime.now()
-        # Check for instances expiring in the next month
-        one_month_ahead = now + timedelta(days=30)
-        target_date = one_month_ahead.strftime('%Y-%m-%d')
-        
-        # Delete instances that are more than 3 months old
-        three_months_ago = now - timedelta(days=90)
-        three_months_ago_str = three_months_ago.strftime('%Y-%m-%d')
+        # Occurrences are expanded on the fly, so only the old overrides need pruning.
+        # Completed ones are history and go to the archive; the rest (skips, edits
+        # nobody completed) are dropped with one indexed DELETE over every series
+        history_start = (datetime.now() - timedelta(days=RECURRENCE_HISTORY_DAYS)).strftime('%Y-%m-%d')
+        archived = archive_in_batches(conn, '''
+            parent_task_id IS NOT NULL AND date IS NOT NULL AND date < ?
+            AND completed = 1 AND completed_at IS NOT NULL
+        ''', (history_start,))
         
-        deleted_count = conn.execute('''
-            DELETE FROM tasks 
-            WHERE parent_task_id IS NOT NULL 
+        old_overrides = '''
+            parent_task_id IS NOT NULL 
             AND date IS NOT NULL 
             AND date < ?
-        ''', (three_months_ago_str,)).rowcount
-        
-        # Find all parent recurring tasks
-        parent_tasks = conn.execute('''
-            SELECT DISTINCT id FROM tasks 
-            WHERE recurrence IS NOT NULL AND parent_task_id IS NULL
-        ''').fetchall()
-        
-        extended_count = 0
-        for parent in parent_tasks:
-            parent_id = parent['id']
-            
-            # Check the latest instance date
-            latest_instance = conn.execute('''
-                SELECT MAX(date) as max_date FROM tasks 
-                WHERE (parent_task_id = ? OR id = ?) AND date IS NOT NULL
-            ''', (parent_id, parent_id)).fetchone()
-            
-            if latest_instance and latest_instance['max_date']:
-                latest_date = datetime.strptime(latest_instance['max_date'], '%Y-%m-%d')
-                
-                # If latest instance is within the next month, extend by another year
-                if latest_date <= one_month_ahead:
-                    # Extend to 1 year from now
-                    extend_to_date = now + timedelta(days=365)
-                    ensure_recurring_instances_exist(conn, parent_id, extend_to_date.strftime('%Y-%m-%d'))
-                    extended_count += 1
-        
+        '''
+        # Count the series before deleting, in the same write transaction so no row can
+        # change in between (DELETE ... RETURNING needs SQLite 3.35, Bullseye has 3.34)
+        conn.execute('BEGIN IMMEDIATE')
+        series_count = conn.execute(f'''
+            SELECT COUNT(DISTINCT parent_task_id) FROM tasks WHERE {old_overrides}
+        ''', (history_start,)).fetchone()[0]
+        deleted = conn.execute(f'DELETE FROM tasks WHERE {old_overrides}', (history_start,)).rowcount
         conn.commit()
-        print(f"[Weekly Job] Deleted {deleted_count} old instance(s) (>3 months), extended {extended_count} recurring task(s) that were expiring soon")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"[Weekly Job] Archived {archived} completed and deleted {deleted} other old "
+              f"recurring override(s) (>3 months), from {series_count} series, in {elapsed_ms:.1f} ms")
     except Exception as e:
         print(f"[Weekly Job] Error in weekly job: {e}")
         conn.rollback()
     finally:
         conn.close()
 
+# Rows removed per retention batch; each batch is its own short write transaction
+CLEANUP_BATCH_SIZE = 500
+
+def delete_in_batches(conn, table, where, params=()):
+    """Delete matching rows a bounded batch at a time, committing between batches"""
+    total = 0
+    while True:
+        deleted = conn.execute(f'''
+            DELETE FROM {table} 
+            WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)
+        ''', (*params, CLEANUP_BATCH_SIZE)).rowcount
+        conn.commit()
+        total += deleted
+        if deleted < CLEANUP_BATCH_SIZE:
+            return total
+
+# Task columns kept by the archive, in tasks_archive's order
+ARCHIVE_COLUMNS = ('id, task, date, time, completed, completed_at, created_at, user_id, created_by, '
+                   'visibility, assigned_to, recurrence, parent_task_id, occurrence_date, cancelled')
+
+def archive_in_batches(conn, where, params=()):
+    """Move matching tasks and their checklists to tasks_archive a bounded batch at a time.
+    
+    Each batch is copied and deleted in one short write transaction, so a task is
+    always in exactly one of the two tables.
+    """
+    total = 0
+    while True:
+        task_ids = [row['id'] for row in conn.execute(
+            f'SELECT id FROM tasks WHERE {where} LIMIT ?', (*params, CLEANUP_BATCH_SIZE)
+        ).fetchall()]
+        if not task_ids:
+            return total
+        placeholders = ', '.join('?' for _ in task_ids)
+        conn.execute(f'''
+            INSERT INTO tasks_archive ({ARCHIVE_COLUMNS}, checklist)
+            SELECT {ARCHIVE_COLUMNS}, (
+                SELECT json_group_array(json_object(
+                    'item_text', item_text, 'completed', completed, 'created_at', created_at))
+                FROM (SELECT * FROM checklist_items WHERE task_id = tasks.id ORDER BY id)
+            )
+            FROM tasks WHERE id IN ({placeholders})
+        ''', task_ids)
+        # Checklist items go with their tasks through the foreign key cascade
+        conn.execute(f'DELETE FROM tasks WHERE id IN ({placeholders})', task_ids)
+        conn.commit()
+        total += len(task_ids)
+        if len(task_ids) < CLEANUP_BATCH_SIZE:
+            return total
+
 def cleanup_old_completed_tasks():
-    """Remove completed tasks older than 1 month"""
+    """Hourly job to archive completed tasks older than 1 month"""
     conn = get_db()
-    one_month_ago = (datetime.now() - timedelta(days=30)).isoformat()
-    conn.execute('''
-        DELETE FROM tasks 
-        WHERE completed = 1 AND completed_at < ?
-    ''', (one_month_ago,))
-    # Also clean up old completion requests
-    conn.execute('''
-        DELETE FROM task_completion_requests 
-        WHERE status != 'pending' AND requested_at < ?
-    ''', (one_month_ago,))
-    conn.commit()
-    conn.close()
+    try:
+        one_month_ago = (datetime.now() - timedelta(days=30)).isoformat()
+        # Recurring parents hold the rule for their whole series, and completed overrides
+        # must outlive the series' history window, so only one-off tasks are archived here
+        tasks_count = archive_in_batches(conn, '''
+            completed = 1 AND completed_at < ?
+            AND parent_task_id IS NULL AND recurrence IS NULL
+        ''', (one_month_ago,))
+        # Also clean up old completion requests
+        requests_count = delete_in_batches(conn, 'task_completion_requests',
+                                           "status != 'pending' AND requested_at < ?",
+                                           (one_month_ago,))
+        # And change log entries no client should still need
+        log_count = delete_in_batches(conn, 'change_log', 'changed_at < datetime(\'now\', ?)',
+                                      (f'-{CHANGE_LOG_RETENTION_DAYS} days',))
+        # And idempotency keys older than any queued write can be
+        keys_count = delete_in_batches(conn, 'idempotency_keys', 'created_at < datetime(\'now\', ?)',
+                                       (f'-{IDEMPOTENCY_KEY_RETENTION_DAYS} days',))
+        print(f"[Cleanup Job] Archived {tasks_count} completed task(s), deleted "
+              f"{requests_count} completion request(s), {log_count} change log entr(ies), "
+              f"{keys_count} idempotency key(s)")
+    except Exception as e:
+        print(f"[Cleanup Job] Error in cleanup job: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+# Seconds between keepalive comments on idle event streams
+EVENT_KEEPALIVE_SECONDS = 25
+# Events buffered per stream before a slow client starts missing them
+EVENT_QUEUE_SIZE = 100
+
+class EventBroker:
+    """In-process pub/sub fanning write events out to the open /api/events streams"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+    
+    def subscribe(self, is_admin):
+        """Register a stream and get the queue its events are delivered to"""
+        subscriber = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[subscriber] = is_admin
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+    
+    def publish(self, event, data=None, admin_only=False):
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for subscriber, is_admin in subscribers:
+            if admin_only and not is_admin:
+                continue
+            try:
+                subscriber.put_nowait((event, data or {}))
+            except queue.Full:
+                # The client is not reading; it catches up with a sync when it reconnects
+                pass
+
+event_broker = EventBroker()
+
+def publish_event(event, data=None, admin_only=False):
+    """Notify open event streams about a committed change.
+    
+    Events only say what kind of thing changed. Clients fetch the details through
+    the regular endpoints, so no task data bypasses the visibility rules.
+    """
+    event_broker.publish(event, data, admin_only)
+
+# Werkzeug hash method (with its cost parameters) for new and upgraded password hashes.
+# A cheaper setting such as 'pbkdf2:sha256:600000' can be used on slow hardware.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+# Password hashes computed at once; more requests queue instead of starving other threads of CPU
+PASSWORD_HASH_WORKERS = 2
+# Login and registration attempts allowed per client address within the window
+LOGIN_RATE_LIMIT = 10
+LOGIN_RATE_WINDOW = 60
+
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                       thread_name_prefix='password-hash')
+# Method prefix of a hash made with PASSWORD_HASH_METHOD, with the defaults Werkzeug
+# fills in expanded (e.g. 'pbkdf2' becomes 'pbkdf2:sha256:1000000')
+PASSWORD_HASH_PREFIX = generate_password_hash('x', PASSWORD_HASH_METHOD).split('$', 1)[0]
+
+def hash_password(password):
+    """Hash a password on the bounded hashing pool"""
+    return password_executor.submit(generate_password_hash, password, PASSWORD_HASH_METHOD).result()
+
+def verify_password(password_hash, password):
+    """Check a password against its stored hash on the bounded hashing pool"""
+    return password_executor.submit(check_password_hash, password_hash, password).result()
+
+def password_needs_rehash(password_hash):
+    """Whether a stored hash was made with a different method or cost than configured"""
+    return password_hash.split('$', 1)[0] != PASSWORD_HASH_PREFIX
+
+def rehash_password(user_id, password):
+    """Upgrade a user's stored hash to the configured method; runs on the hashing pool"""
+    new_password_hash = generate_password_hash(password, PASSWORD_HASH_METHOD)
+    conn = connect_db()
+    try:
+        conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (new_password_hash, user_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+class RateLimiter:
+    """Sliding-window limit on attempts per key"""
+    
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._attempts = {}
+    
+    def hit(self, key):
+        """Record an attempt; return seconds to wait if the key is over its limit, else 0"""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.setdefault(key, deque())
+            while attempts and attempts[0] <= now - self.window:
+                attempts.popleft()
+            if len(attempts) >= self.limit:
+                return int(attempts[0] + self.window - now) + 1
+            attempts.append(now)
+            # Forget idle clients so the table stays small
+            if len(self._attempts) > 1000:
+                for stale in [k for k, v in self._attempts.items() if not v or v[-1] <= now - self.window]:
+                    del self._attempts[stale]
+            return 0
+
+login_limiter = RateLimiter(LOGIN_RATE_LIMIT, LOGIN_RATE_WINDOW)
+
+def rate_limited(limiter):
+    """Decorator to answer 429 once the client address exceeds the limiter"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            retry_after = limiter.hit(request.remote_addr)
+            if retry_after:
+                response = jsonify({'error': 'Too many attempts. Please try again later.'})
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+# Seconds a cached user is trusted before it is re-read; bounds how long a change
+# made by another process (which cannot invalidate this one's cache) goes unnoticed
+USER_CACHE_TTL = 60
+
+class UserCache:
+    """In-process cache of the user fields that authorization checks need"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+    
+    def get(self, user_id):
+        """Return the user's id, username, is_admin and role_version, or None if they are gone"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry and entry[0] > now:
+            return entry[1]
+        
+        conn = get_db(readonly=True)
+        row = conn.execute('SELECT id, username, is_admin, role_version FROM users WHERE id = ?',
+                           (user_id,)).fetchone()
+        conn.close()
+        user = dict(row) if row else None
+        with self._lock:
+            self._entries[user_id] = (now + USER_CACHE_TTL, user)
+        return user
+    
+    def invalidate(self, user_id):
+        """Drop a user's entry after their row changed"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+user_cache = UserCache()
+
+def start_session(user):
+    """Log a user in, remembering the role version their session was issued for"""
+    session['user_id'] = user['id']
+    session['username'] = user['username']
+    session['is_admin'] = bool(user['is_admin'])
+    session['role_version'] = user['role_version']
+    session.permanent = True
+
+def get_session_user():
+    """Get the logged-in user from the cache, or None if their account no longer exists.
+    
+    A session issued before the user's last role change carries an older role_version;
+    its cached role is refreshed here so every later check in the request sees the new one.
+    """
+    if 'user_id' not in session:
+        return None
+    user = user_cache.get(session['user_id'])
+    if not user:
+        session.clear()
+        return None
+    if session.get('role_version') != user['role_version']:
+        session['is_admin'] = bool(user['is_admin'])
+        session['role_version'] = user['role_version']
+    return user
 
 def login_required(f):
     """Decorator to require login"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if not get_session_user():
             return jsonify({'error': 'Authentication required'}), 401
         return f(*args, **kwargs)
     return decorated_function
@@ -409,36 +1115,175 @@ def admin_required(f):
     """Decorator to require admin privileges"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        user = get_session_user()
+        if not user:
             return jsonify({'error': 'Authentication required'}), 401
-        conn = get_db()
-        user = conn.execute('SELECT is_admin FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-        conn.close()
-        if not user or not user['is_admin']:
+        if not user['is_admin']:
             return jsonify({'error': 'Admin privileges required'}), 403
         return f(*args, **kwargs)
     return decorated_function
 
+def get_data_version(conn):
+    """Counter bumped by triggers on every write to the data responses are built from"""
+    return conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()['version']
+
+def conditional_get(f):
+    """Decorator to answer 304 Not Modified when nothing the response depends on has changed.
+    
+    The weak ETag combines the data version with the user, their role, the request URL
+    and today's date (recurring occurrences and default windows move with it), so the
+    endpoint's own queries only run when the client's copy is stale.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        conn = get_db(readonly=True)
+        version = get_data_version(conn)
+        url_hash = zlib.crc32(request.full_path.encode('utf-8'))
+        etag = '{}-{}-{}-{:08x}-{}'.format(version, session['user_id'], int(bool(session.get('is_admin'))),
+                                          url_hash, datetime.now().strftime('%Y%m%d'))
+        
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        # Let the browser keep the body but revalidate it on every use
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated_function
+
+# Retried writes older than this are applied again rather than replayed
+IDEMPOTENCY_KEY_RETENTION_DAYS = 7
+IDEMPOTENCY_KEY_MAX_LENGTH = 100
+
+def idempotent(f):
+    """Decorator to replay the stored response when a write is retried with the same Idempotency-Key.
+    
+    The service worker queues writes made while offline and replays them later; if the
+    first attempt did reach the server, the retry gets its answer instead of being applied
+    again. Requests without the header are handled as usual.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(*args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return jsonify({'error': 'Idempotency-Key is too long'}), 400
+        
+        conn = get_db(readonly=True)
+        stored = conn.execute('''
+            SELECT status_code, response_body FROM idempotency_keys WHERE user_id = ? AND key = ?
+        ''', (session['user_id'], key)).fetchone()
+        conn.close()
+        if stored:
+            return app.response_class(stored['response_body'], status=stored['status_code'],
+                                      mimetype='application/json')
+        
+        response = app.make_response(f(*args, **kwargs))
+        # Failed writes changed nothing, so a retry may run them again
+        if 200 <= response.status_code < 300:
+            conn = get_db()
+            conn.execute('''
+                INSERT OR IGNORE INTO idempotency_keys (user_id, key, status_code, response_body)
+                VALUES (?, ?, ?, ?)
+            ''', (session['user_id'], key, response.status_code, response.get_data(as_text=True)))
+            conn.commit()
+            conn.close()
+        return response
+    return decorated_function
+
 def can_edit_tasks():
     """Check if current user can edit/delete tasks"""
-    if 'user_id' not in session:
-        return False
-    conn = get_db()
-    user = conn.execute('SELECT is_admin FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-    conn.close()
-    return user and user['is_admin'] == 1
+    user = get_session_user()
+    return bool(user and user['is_admin'])
 
 @app.route('/')
 def index():
     """Main page - redirect to login if not authenticated"""
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    cleanup_old_completed_tasks()
     return render_template('index.html')
 
+# Static files worth precompressing; the images are already compressed
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.svg', '.json')
+# Versioned static URLs never change content, so browsers may keep them for a year
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+_static_assets = {}
+
+def get_static_asset(filename):
+    """Get a static file's body, content hash and precompressed variants.
+    
+    Entries are rebuilt when the file's modification time changes, so edits made
+    while the server runs are picked up.
+    """
+    path = safe_join(app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    asset = _static_assets.get(filename)
+    if asset and asset['mtime'] == mtime:
+        return asset
+    
+    with open(path, 'rb') as f:
+        body = f.read()
+    asset = {'mtime': mtime, 'body': body, 'hash': hashlib.sha256(body).hexdigest()[:12], 'encodings': {}}
+    if filename.endswith(COMPRESSIBLE_EXTENSIONS):
+        asset['encodings']['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            asset['encodings']['br'] = brotli.compress(body)
+    _static_assets[filename] = asset
+    return asset
+
+def get_asset_version():
+    """Hash over every static asset, naming the service worker's cache"""
+    hashes = [get_static_asset(name)['hash'] for name in sorted(os.listdir(app.static_folder))
+              if os.path.isfile(os.path.join(app.static_folder, name))]
+    return hashlib.sha256(''.join(hashes).encode('ascii')).hexdigest()[:12]
+
+@app.url_defaults
+def add_static_version(endpoint, values):
+    """Version static URLs by content hash so they can be cached for good"""
+    if endpoint == 'static' and 'v' not in values:
+        asset = get_static_asset(values.get('filename', ''))
+        if asset:
+            values['v'] = asset['hash']
+
+def serve_static(filename):
+    """Serve a static file, precompressed when the client accepts it"""
+    asset = get_static_asset(filename)
+    if asset is None:
+        return send_from_directory(app.static_folder, filename)
+    
+    encoding = next((name for name in ('br', 'gzip')
+                     if name in asset['encodings'] and request.accept_encodings[name]), None)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = Response(asset['encodings'][encoding] if encoding else asset['body'], mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(f"{asset['hash']}-{encoding or 'identity'}")
+    
+    if request.args.get('v') == asset['hash']:
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        # Unversioned URLs (e.g. icons named in the manifest) revalidate with the ETag
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+app.view_functions['static'] = serve_static
+
+# Hash and compress the assets once at startup rather than on the first requests
+for _filename in os.listdir(app.static_folder):
+    get_static_asset(_filename)
+
 @app.route('/service-worker.js')
 def service_worker():
-    response = send_from_directory('static', 'service-worker.js')
+    response = app.response_class(render_template('service-worker.js', asset_version=get_asset_version()),
+                                  mimetype='application/javascript')
     response.headers['Cache-Control'] = 'no-cache'
     return response
 
@@ -457,6 +1302,7 @@ def register():
     return render_template('register.html')
 
 @app.route('/api/auth/login', methods=['POST'])
+@rate_limited(login_limiter)
 def api_login():
     """Login API endpoint"""
     data = request.json
@@ -470,13 +1316,14 @@ def api_login():
     user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
     conn.close()
     
-    if not user or not check_password_hash(user['password_hash'], password):
+    if not user or not verify_password(user['password_hash'], password):
         return jsonify({'error': 'Invalid username or password'}), 401
     
-    session['user_id'] = user['id']
-    session['username'] = user['username']
-    session['is_admin'] = bool(user['is_admin'])
-    session.permanent = True
+    # Upgrade hashes made with older settings while the plain password is at hand
+    if password_needs_rehash(user['password_hash']):
+        password_executor.submit(rehash_password, user['id'], password)
+    
+    start_session(user)
     
     return jsonify({
         'message': 'Login successful',
@@ -488,6 +1335,7 @@ def api_login():
     })
 
 @app.route('/api/auth/register', methods=['POST'])
+@rate_limited(login_limiter)
 def api_register():
     """Register API endpoint"""
     # Ensure database is initialized
@@ -528,7 +1376,7 @@ def api_register():
         app.logger.error(f'Error checking user count: {e}')
         return jsonify({'error': 'Database error occurred'}), 500
     
-    password_hash = generate_password_hash(password)
+    password_hash = hash_password(password)
     
     if user_count == 0:
         # First user is automatically an admin
@@ -573,6 +1421,7 @@ def api_register():
             session['user_id'] = user_id
             session['username'] = username
             session['is_admin'] = True
+            session['role_version'] = 0
             session.permanent = True
             # Explicitly mark session as modified
             session.modified = True
@@ -605,6 +1454,7 @@ def api_register():
         ''', (username, password_hash))
         conn.commit()
         conn.close()
+        publish_event('account_request', {'action': 'created'}, admin_only=True)
         
         return jsonify({
             'message': 'Account request submitted. Waiting for admin approval.'
@@ -619,15 +1469,8 @@ def api_logout():
 @app.route('/api/auth/status', methods=['GET'])
 def api_auth_status():
     """Get current authentication status"""
-    if 'user_id' not in session:
-        return jsonify({'authenticated': False}), 200
-    
-    conn = get_db()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-    conn.close()
-    
+    user = get_session_user()
     if not user:
-        session.clear()
         return jsonify({'authenticated': False}), 200
     
     return jsonify({
@@ -641,6 +1484,7 @@ def api_auth_status():
 
 @app.route('/api/auth/change-password', methods=['POST'])
 @login_required
+@rate_limited(login_limiter)
 def change_password():
     """Change user password"""
     data = request.json
@@ -670,7 +1514,7 @@ def change_password():
             conn.close()
             return jsonify({'error': 'Admin not found'}), 404
         
-        if not check_password_hash(admin['password_hash'], current_password):
+        if not verify_password(admin['password_hash'], current_password):
             conn.close()
             return jsonify({'error': 'Admin password is incorrect'}), 401
         
@@ -681,10 +1525,11 @@ def change_password():
             return jsonify({'error': 'Target user not found'}), 404
         
         # Update target user's password
-        new_password_hash = generate_password_hash(new_password)
+        new_password_hash = hash_password(new_password)
         conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (new_password_hash, target_user_id))
         conn.commit()
         conn.close()
+        user_cache.invalidate(target_user['id'])
         
         return jsonify({'message': f"Password changed successfully for user '{target_user['username']}'"})
     else:
@@ -698,18 +1543,74 @@ def change_password():
             return jsonify({'error': 'User not found'}), 404
         
         # Verify current password
-        if not check_password_hash(user['password_hash'], current_password):
+        if not verify_password(user['password_hash'], current_password):
             conn.close()
             return jsonify({'error': 'Current password is incorrect'}), 401
         
         # Update password
-        new_password_hash = generate_password_hash(new_password)
+        new_password_hash = hash_password(new_password)
         conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (new_password_hash, admin_id))
         conn.commit()
         conn.close()
+        user_cache.invalidate(admin_id)
         
         return jsonify({'message': 'Password changed successfully'})
 
+@app.route('/api/events', methods=['GET'])
+@login_required
+def event_stream():
+    """Server-Sent Events stream of change notifications for the current user"""
+    is_admin = session.get('is_admin', False)
+    subscriber = event_broker.subscribe(is_admin)
+    # Under several worker processes, writes made by the others never reach this
+    # process's broker, so the stream also watches the shared data version
+    poll_seconds = app.config.get('EVENT_POLL_SECONDS')
+    
+    def read_version():
+        conn = connect_db()
+        try:
+            return get_data_version(conn)
+        finally:
+            conn.close()
+    
+    def stream():
+        try:
+            # Tell EventSource how long to wait before reconnecting
+            yield 'retry: 5000\n\n'
+            version = read_version() if poll_seconds else None
+            idle = 0
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=poll_seconds or EVENT_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    if poll_seconds:
+                        latest = read_version()
+                        if latest != version:
+                            version = latest
+                            idle = 0
+                            yield 'event: task_changed\ndata: {}\n\n'
+                            if is_admin:
+                                yield 'event: completion_request\ndata: {}\n\n'
+                            continue
+                        idle += poll_seconds
+                        if idle < EVENT_KEEPALIVE_SECONDS:
+                            continue
+                    idle = 0
+                    yield ': keepalive\n\n'
+                    continue
+                if poll_seconds:
+                    # This process's own write is being delivered; don't announce it twice
+                    version = read_version()
+                idle = 0
+                yield f'event: {event}\ndata: {json.dumps(data)}\n\n'
+        finally:
+            event_broker.unsubscribe(subscriber)
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/account-requests', methods=['GET'])
 @login_required
 @admin_required
@@ -784,6 +1685,8 @@ def create_task_completion_request():
     
     conn.commit()
     conn.close()
+    publish_event('completion_request', {'action': 'created'}, admin_only=True)
+    publish_event('task_changed', {'task_id': task_id})
     
     return jsonify({'message': 'Completion request submitted. Waiting for admin approval.'}), 201
 
@@ -813,6 +1716,8 @@ def handle_task_completion_request(request_id):
         conn.execute('UPDATE task_completion_requests SET status = ? WHERE id = ?', ('rejected', request_id))
         conn.commit()
         conn.close()
+        publish_event('completion_request', {'action': 'rejected'}, admin_only=True)
+        publish_event('task_changed', {'task_id': req['task_id']})
         return jsonify({'message': 'Request rejected'})
     
     # Approve: mark task as complete
@@ -826,6 +1731,8 @@ def handle_task_completion_request(request_id):
     conn.execute('UPDATE task_completion_requests SET status = ? WHERE id = ?', ('approved', request_id))
     conn.commit()
     conn.close()
+    publish_event('completion_request', {'action': 'approved'}, admin_only=True)
+    publish_event('task_changed', {'task_id': req['task_id']})
     
     return jsonify({'message': 'Task marked as complete'})
 
@@ -851,19 +1758,23 @@ def handle_account_request(request_id):
         conn.execute('DELETE FROM account_requests WHERE id = ?', (request_id,))
         conn.commit()
         conn.close()
+        publish_event('account_request', {'action': 'rejected'}, admin_only=True)
         return jsonify({'message': 'Request rejected'})
     
     # Approve the account
     is_admin = 1 if action == 'approve_admin' else 0
-    conn.execute('''
+    cursor = conn.execute('''
         INSERT INTO users (username, password_hash, is_admin)
         VALUES (?, ?, ?)
     ''', (req['username'], req['password_hash'], is_admin))
+    new_user_id = cursor.lastrowid
     
     # Delete the request
     conn.execute('DELETE FROM account_requests WHERE id = ?', (request_id,))
     conn.commit()
     conn.close()
+    user_cache.invalidate(new_user_id)
+    publish_event('account_request', {'action': 'approved'}, admin_only=True)
     
     return jsonify({
         'message': f'Account approved as {"admin" if is_admin else "regular user"}'
@@ -924,12 +1835,19 @@ def update_user(user_id):
         return jsonify({'error': 'Cannot delete your own account'}), 400
     
     if action == 'delete':
-        # Delete user's tasks first
-        conn.execute('DELETE FROM tasks WHERE user_id = ?', (user_id,))
+        # Delete user's tasks and completion requests first
+        conn.execute('DELETE FROM tasks WHERE user_id = ? OR created_by = ?', (user_id, user_id))
+        conn.execute('DELETE FROM tasks_archive WHERE user_id = ? OR created_by = ?', (user_id, user_id))
+        conn.execute('DELETE FROM task_completion_requests WHERE requested_by = ?', (user_id,))
+        # Tasks other users assigned to them become unassigned
+        conn.execute('UPDATE tasks SET assigned_to = NULL WHERE assigned_to = ?', (user_id,))
+        conn.execute('UPDATE tasks_archive SET assigned_to = NULL WHERE assigned_to = ?', (user_id,))
         # Delete user
         conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
         conn.commit()
         conn.close()
+        user_cache.invalidate(user_id)
+        publish_event('task_changed')
         return jsonify({'message': 'User deleted successfully'})
     
     if action == 'change_role':
@@ -943,101 +1861,310 @@ def update_user(user_id):
             conn.close()
             return jsonify({'error': 'Cannot remove your own admin privileges'}), 400
         
-        conn.execute('UPDATE users SET is_admin = ? WHERE id = ?', (1 if new_role else 0, user_id))
+        conn.execute('''
+            UPDATE users SET is_admin = ?, role_version = role_version + 1 WHERE id = ?
+        ''', (1 if new_role else 0, user_id))
         conn.commit()
         conn.close()
+        user_cache.invalidate(user_id)
         return jsonify({'message': 'User role updated successfully'})
 
 @app.route('/api/tasks', methods=['GET'])
 @login_required
+@conditional_get
 def get_tasks():
-    """Get all tasks visible to the current user"""
-    conn = get_db()
+    """Get the tasks visible to the current user.
+    
+    With ?limit= the list is returned a page at a time: X-Next-Cursor carries the
+    cursor for ?cursor= to fetch the following page and is absent on the last one.
+    ?fields= limits each task to the listed columns.
+    """
     show_completed = request.args.get('completed', 'false').lower() == 'true'
     user_id = session['user_id']
     is_admin = session.get('is_admin', False)
     
-    # Ensure recurring instances exist for all parent tasks (up to 1 year ahead)
-    parent_tasks = conn.execute('''
-        SELECT DISTINCT id FROM tasks 
-        WHERE recurrence IS NOT NULL AND parent_task_id IS NULL
-    ''').fetchall()
-    for parent in parent_tasks:
-        ensure_recurring_instances_exist(conn, parent['id'])
-    conn.commit()
+    limit = request.args.get('limit', type=int)
+    if limit is not None and not 1 <= limit <= TASK_PAGE_MAX:
+        return jsonify({'error': f'limit must be between 1 and {TASK_PAGE_MAX}'}), 400
     
-    # Build visibility filter
-    if is_admin:
-        # Admins see: 
-        # - Tasks with visibility='all' and not assigned (assigned to all users)
-        # - Tasks with visibility='admins' and not assigned (assigned to all admins)
-        # - Tasks assigned to non-admins
-        # - Tasks assigned to admins that are NOT private (visibility != 'private')
-        # - Their own private tasks (visibility='private' AND created_by = user_id)
-        # - All tasks created by regular users (to ensure admin oversight)
-        visibility_filter = '''
-            ((visibility = 'all' AND assigned_to IS NULL) OR
-             (visibility = 'admins' AND assigned_to IS NULL) OR
-             (assigned_to IS NOT NULL AND assigned_to IN (SELECT id FROM users WHERE is_admin = 0)) OR
-             (assigned_to IS NOT NULL AND assigned_to IN (SELECT id FROM users WHERE is_admin = 1) AND visibility != 'private') OR
-             (visibility = 'private' AND created_by = ?) OR
-             (created_by IN (SELECT id FROM users WHERE is_admin = 0)))
-        '''
-        params = (user_id,)
-    else:
-        # Regular users see: 
-        # - Tasks with visibility='all' that are not assigned to anyone (global tasks, typically created by admins)
-        # - Tasks assigned to them
-        # - Tasks they created (their own tasks)
-        # They should NOT see tasks created by other non-admins unless assigned to them
-        # Note: Tasks created by non-admins should have assigned_to = created_by, so they won't match the first condition
-        visibility_filter = '''
-            ((visibility = 'all' AND assigned_to IS NULL AND created_by IN (SELECT id FROM users WHERE is_admin = 1)) OR 
-             assigned_to = ? OR 
-             (created_by = ? AND visibility != 'admins'))
-        '''
-        params = (user_id, user_id)
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in TASK_FIELDS]
+        if unknown:
+            return jsonify({'error': f'Unknown field(s): {", ".join(unknown)}'}), 400
     
+    # Keyset pagination on the plain columns of idx_tasks_list / idx_tasks_completed_at,
+    # so the index supplies the order and seeks to the cursor; id breaks ties
     if show_completed:
-        query = f'''
-            SELECT t.*, u.username as creator_username, u2.username as assigned_to_username,
-                   CASE WHEN EXISTS (
-                       SELECT 1 FROM task_completion_requests tcr 
-                       WHERE tcr.task_id = t.id AND tcr.status = 'pending'
-                   ) THEN 1 ELSE 0 END as has_pending_request
-            FROM tasks t
-            LEFT JOIN users u ON t.created_by = u.id
-            LEFT JOIN users u2 ON t.assigned_to = u2.id
-            WHERE completed = 1 AND ({visibility_filter}) AND (t.parent_task_id IS NULL)
-            ORDER BY completed_at DESC
-        '''
-        tasks = conn.execute(query, params).fetchall()
+        sort_key = ['t.completed_at', 't.id']
+        order_by = 't.completed_at DESC, t.id DESC'
+    else:
+        sort_key = ['t.date', 't.time', 't.created_at', 't.id']
+        order_by = 't.date ASC, t.time ASC, t.created_at ASC, t.id ASC'
+    
+    visibility_filter, params = get_visibility_filter(is_admin, user_id)
+    cursor_filter = ''
+    if request.args.get('cursor'):
+        cursor_values = decode_page_cursor(request.args['cursor'], len(sort_key))
+        if cursor_values is None or (show_completed and cursor_values[0] is None):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if show_completed:
+            # completed_at is never NULL on completed tasks, so a row value comparison will do
+            cursor_filter = 'AND (t.completed_at, t.id) < (?, ?)'
+            cursor_params = tuple(cursor_values)
+        else:
+            cursor_filter, cursor_params = keyset_after(sort_key, cursor_values)
+            cursor_filter = f'AND {cursor_filter}'
+        params = params + cursor_params
+    
+    limit_clause = ''
+    if limit is not None:
+        # One extra row tells whether another page follows
+        limit_clause = 'LIMIT ?'
+        params = params + (limit + 1,)
+    
+    conn = get_db(readonly=True)
+    checklist_columns, checklist_join = get_checklist_summary_sql()
+    # Read the cursor first so changes made during the query are sent again on the next sync
+    sync_cursor = get_sync_cursor(conn)
+    
+    query = f'''
+        SELECT t.*, u.username as creator_username, u2.username as assigned_to_username,
+               CASE WHEN EXISTS (
+                   SELECT 1 FROM task_completion_requests tcr 
+                   WHERE tcr.task_id = t.id AND tcr.status = 'pending'
+               ) THEN 1 ELSE 0 END as has_pending_request
+               {checklist_columns}
+        FROM tasks t
+        {TASK_USER_JOINS}
+        {checklist_join}
+        WHERE completed = ? AND ({visibility_filter}) AND (t.parent_task_id IS NULL)
+        {cursor_filter}
+        ORDER BY {order_by}
+        {limit_clause}
+    '''
+    params = (1 if show_completed else 0,) + params
+    
+    def project(task):
+        task = dict(task)
+        return {field: task.get(field) for field in fields} if fields else task
+    
+    if limit is None:
+        # The whole list can hold a long history, so it is streamed rather than built in memory
+        conn.close()
+        response = stream_query_json(query, params, project)
+        response.headers['X-Sync-Cursor'] = str(sync_cursor)
+        return response
+    
+    tasks = [dict(task) for task in conn.execute(query, params).fetchall()]
+    conn.close()
+    
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        last = tasks[-1]
+        if show_completed:
+            next_cursor = encode_page_cursor([last['completed_at'], last['id']])
+        else:
+            next_cursor = encode_page_cursor([last['date'], last['time'], last['created_at'], last['id']])
+    
+    response = jsonify([project(task) for task in tasks])
+    response.headers['X-Sync-Cursor'] = str(sync_cursor)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+# Archived tasks per /api/history page when no ?limit= is given
+HISTORY_PAGE_SIZE = 50
+
+@app.route('/api/history', methods=['GET'])
+@login_required
+@conditional_get
+def get_history():
+    """Get the archived tasks visible to the current user, most recently completed first.
+    
+    Pages like /api/tasks: ?limit= sets the page size and X-Next-Cursor, absent on
+    the last page, is passed back as ?cursor= for the next one.
+    """
+    user_id = session['user_id']
+    is_admin = session.get('is_admin', False)
+    
+    limit = request.args.get('limit', HISTORY_PAGE_SIZE, type=int)
+    if not 1 <= limit <= TASK_PAGE_MAX:
+        return jsonify({'error': f'limit must be between 1 and {TASK_PAGE_MAX}'}), 400
+    
+    visibility_filter, params = get_visibility_filter(is_admin, user_id)
+    cursor_filter = ''
+    if request.args.get('cursor'):
+        cursor_values = decode_page_cursor(request.args['cursor'], 2)
+        if cursor_values is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        cursor_filter = 'AND (t.completed_at, t.id) < (?, ?)'
+        params = params + tuple(cursor_values)
+    
+    conn = get_db(readonly=True)
+    tasks = [dict(task) for task in conn.execute(f'''
+        SELECT t.*, u.username as creator_username, u2.username as assigned_to_username
+        FROM tasks_archive t
+        {TASK_USER_JOINS}
+        WHERE ({visibility_filter})
+        {cursor_filter}
+        ORDER BY t.completed_at DESC, t.id DESC
+        LIMIT ?
+    ''', params + (limit + 1,)).fetchall()]
+    conn.close()
+    
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_page_cursor([tasks[-1]['completed_at'], tasks[-1]['id']])
+    for task in tasks:
+        task['checklist'] = json.loads(task['checklist'] or '[]')
+    
+    response = jsonify(tasks)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+# Largest number of results /api/search returns
+SEARCH_MAX_RESULTS = 50
+# Above this many matches, scoring every one costs more than it tells apart,
+# so the newest matches are returned instead of the best ranked
+SEARCH_RANKED_MATCHES = 1000
+# Markers FTS5 puts around matched terms; swapped for <mark> once the text is escaped
+SEARCH_MATCH_START = '\x02'
+SEARCH_MATCH_END = '\x03'
+
+def build_search_query(text):
+    """Turn what the user typed into an FTS5 query: every word must match, as a prefix"""
+    words = [word.replace('"', '') for word in text.split()]
+    return ' '.join(f'"{word}"*' for word in words if word)
+
+def highlight_search_match(text):
+    """HTML-escape highlighted text from the index and mark the matched terms"""
+    if not text:
+        return text
+    return (html.escape(text)
+            .replace(SEARCH_MATCH_START, '<mark>')
+            .replace(SEARCH_MATCH_END, '</mark>'))
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+def search_tasks():
+    """Search the text and checklists of the tasks visible to the current user.
+    
+    Results are ranked best first (matches in the task text weigh more than in its
+    checklist), or newest first for very broad queries, and carry task_highlight /
+    checklist_snippet HTML with <mark>ed terms.
+    """
+    limit = request.args.get('limit', SEARCH_MAX_RESULTS, type=int)
+    if limit < 1:
+        # SQLite reads a negative LIMIT as no limit at all
+        return jsonify({'error': 'limit must be at least 1'}), 400
+    limit = min(limit, SEARCH_MAX_RESULTS)
+    match_query = build_search_query(request.args.get('q', ''))
+    if not match_query:
+        return jsonify([])
+    
+    conn = get_db(readonly=True)
+    visibility_filter, params = get_visibility_filter(session.get('is_admin', False), session['user_id'])
+    match_count = conn.execute('SELECT COUNT(*) as count FROM task_search WHERE task_search MATCH ?',
+                               (match_query,)).fetchone()['count']
+    if match_count <= SEARCH_RANKED_MATCHES:
+        order_by = 'bm25(task_search, 10.0, 1.0)'
     else:
-        query = f'''
+        order_by = 'task_search.rowid DESC'
+    
+    tasks = conn.execute(f'''
+        SELECT t.*, u.username as creator_username, u2.username as assigned_to_username,
+               CASE WHEN EXISTS (
+                   SELECT 1 FROM task_completion_requests tcr 
+                   WHERE tcr.task_id = t.id AND tcr.status = 'pending'
+               ) THEN 1 ELSE 0 END as has_pending_request,
+               highlight(task_search, 0, ?, ?) as task_highlight,
+               snippet(task_search, 1, ?, ?, '…', 12) as checklist_snippet
+               {CHECKLIST_SUMMARY_COLUMNS}
+        FROM task_search
+        JOIN tasks t ON t.id = task_search.rowid
+        {TASK_USER_JOINS}
+        {CHECKLIST_SUMMARY_JOIN}
+        WHERE task_search MATCH ? AND ({visibility_filter}) AND t.parent_task_id IS NULL
+        ORDER BY {order_by}
+        LIMIT ?
+    ''', (SEARCH_MATCH_START, SEARCH_MATCH_END, SEARCH_MATCH_START, SEARCH_MATCH_END,
+          match_query) + params + (limit,)).fetchall()
+    conn.close()
+    
+    results = []
+    for task in tasks:
+        task = dict(task)
+        task['task_highlight'] = highlight_search_match(task['task_highlight'])
+        # The snippet falls back to the start of the checklist when only the task text matched
+        if SEARCH_MATCH_START in (task['checklist_snippet'] or ''):
+            task['checklist_snippet'] = highlight_search_match(task['checklist_snippet'])
+        else:
+            task['checklist_snippet'] = None
+        results.append(task)
+    
+    return jsonify(results)
+
+@app.route('/api/sync', methods=['GET'])
+@login_required
+def sync_tasks():
+    """Get the tasks changed since a sync cursor, with the same visibility rules as get_tasks"""
+    conn = get_db(readonly=True)
+    user_id = session['user_id']
+    is_admin = session.get('is_admin', False)
+    since = request.args.get('since', type=int)
+    
+    cursor = get_sync_cursor(conn)
+    oldest = conn.execute('SELECT MIN(id) as min_id FROM change_log').fetchone()['min_id']
+    if oldest is None:
+        oldest = cursor + 1
+    
+    # Without a usable cursor the client has to reload the full lists
+    if since is None or since > cursor or since + 1 < oldest:
+        conn.close()
+        return jsonify({'cursor': cursor, 'reset': True})
+    
+    changed_ids = [row['task_id'] for row in conn.execute('''
+        SELECT DISTINCT task_id FROM change_log
+        WHERE id > ? AND id <= ?
+    ''', (since, cursor)).fetchall()]
+    if len(changed_ids) > SYNC_MAX_CHANGES:
+        conn.close()
+        return jsonify({'cursor': cursor, 'reset': True})
+    
+    tasks = []
+    if changed_ids:
+        visibility_filter, params = get_visibility_filter(is_admin, user_id)
+        placeholders = ', '.join('?' for _ in changed_ids)
+        tasks = conn.execute(f'''
             SELECT t.*, u.username as creator_username, u2.username as assigned_to_username,
                    CASE WHEN EXISTS (
                        SELECT 1 FROM task_completion_requests tcr 
                        WHERE tcr.task_id = t.id AND tcr.status = 'pending'
                    ) THEN 1 ELSE 0 END as has_pending_request
+                   {CHECKLIST_SUMMARY_COLUMNS}
             FROM tasks t
-            LEFT JOIN users u ON t.created_by = u.id
-            LEFT JOIN users u2 ON t.assigned_to = u2.id
-            WHERE completed = 0 AND ({visibility_filter}) AND (t.parent_task_id IS NULL)
-            ORDER BY date ASC, time ASC, created_at ASC
-        '''
-        tasks = conn.execute(query, params).fetchall()
-    
+            {TASK_USER_JOINS}
+            {CHECKLIST_SUMMARY_JOIN}
+            WHERE t.id IN ({placeholders}) AND ({visibility_filter})
+        ''', tuple(changed_ids) + params).fetchall()
     conn.close()
-    return jsonify([dict(task) for task in tasks])
+    
+    # Deleted tasks and tasks that are no longer visible are sent as removals
+    tasks = [dict(task) for task in tasks]
+    returned_ids = set(task['id'] for task in tasks)
+    removed = [task_id for task_id in changed_ids if task_id not in returned_ids]
+    
+    return jsonify({'cursor': cursor, 'tasks': tasks, 'removed': removed})
 
-@app.route('/api/tasks', methods=['POST'])
-@login_required
-def create_task():
-    """Create a new task"""
-    data = request.json
-    conn = get_db()
-    user_id = session['user_id']
-    is_admin = session.get('is_admin', False)
+def apply_create_task(conn, data, user_id, is_admin):
+    """Insert a task on conn without committing; returns the response body and status"""
+    if 'task' not in data:
+        return {'error': 'Task text is required'}, 400
     created_by = user_id
     
     # Handle assignment/visibility
@@ -1055,8 +2182,7 @@ def create_task():
             # If assigned to a user, validate the user exists
             assigned_user = conn.execute('SELECT id, is_admin FROM users WHERE id = ?', (assigned_to,)).fetchone()
             if not assigned_user:
-                conn.close()
-                return jsonify({'error': 'Assigned user not found'}), 400
+                return {'error': 'Assigned user not found'}, 400
             # If assigned to an admin, use 'admins' visibility unless it's private
             if assigned_user['is_admin']:
                 if visibility == 'private':
@@ -1077,15 +2203,13 @@ def create_task():
     
     # Validate: recurring tasks must have a date
     if recurrence and not data.get('date'):
-        conn.close()
-        return jsonify({'error': 'Recurring tasks require a start date.'}), 400
+        return {'error': 'Recurring tasks require a start date.'}, 400
     
     cursor = conn.execute('''
         INSERT INTO tasks (task, date, time, user_id, created_by, visibility, assigned_to, recurrence)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     ''', (data['task'], data.get('date'), data.get('time'), user_id, created_by, visibility, assigned_to, recurrence))
     
-    conn.commit()
     task_id = cursor.lastrowid
     
     # Fallback: if lastrowid is not available, query for the task ID
@@ -1098,37 +2222,31 @@ def create_task():
         if task:
             task_id = task['id']
     
-    # Generate recurring instances if recurrence is set and date exists
-    if recurrence and data.get('date'):
-        end_date = datetime.now() + timedelta(days=365)  # 1 year ahead
-        generate_recurring_instances(conn, task_id, data['date'], recurrence, data.get('time'),
-                                   user_id, created_by, visibility, assigned_to, end_date)
-        conn.commit()
-    
-    conn.close()
-    
+    # Recurring occurrences are expanded from the rule when read, nothing to generate here
     if not task_id:
-        return jsonify({'error': 'Failed to create task'}), 500
+        return {'error': 'Failed to create task'}, 500
     
-    return jsonify({'id': task_id, 'message': 'Task created successfully'}), 201
+    return {'id': task_id, 'message': 'Task created successfully'}, 201
 
-@app.route('/api/tasks/<int:task_id>', methods=['PUT'])
+@app.route('/api/tasks', methods=['POST'])
 @login_required
-def update_task(task_id):
-    """Update a task - only admins can edit"""
-    if not can_edit_tasks():
-        return jsonify({'error': 'Permission denied. Only admins can edit tasks.'}), 403
-    
-    data = request.json
+def create_task():
+    """Create a new task"""
     conn = get_db()
-    user_id = session['user_id']
-    is_admin = session.get('is_admin', False)
-    
+    result, status = apply_create_task(conn, request.json, session['user_id'], session.get('is_admin', False))
+    if status < 400:
+        conn.commit()
+    conn.close()
+    if status < 400:
+        publish_event('task_changed', {'task_id': result['id']})
+    return jsonify(result), status
+
+def apply_update_task(conn, task_id, data, user_id, is_admin):
+    """Update a task on conn without committing; returns the response body and status"""
     # Get task with visibility check
     task = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
     if not task:
-        conn.close()
-        return jsonify({'error': 'Task not found'}), 404
+        return {'error': 'Task not found'}, 404
     
     # Check if user can edit this task
     can_edit = False
@@ -1142,8 +2260,7 @@ def update_task(task_id):
             can_edit = True
     
     if not can_edit:
-        conn.close()
-        return jsonify({'error': 'Permission denied. You cannot edit this task.'}), 403
+        return {'error': 'Permission denied. You cannot edit this task.'}, 403
     
     if 'completed' in data:
         # Mark as complete/incomplete
@@ -1170,8 +2287,7 @@ def update_task(task_id):
                 # If assigned to a user, validate the user exists
                 assigned_user = conn.execute('SELECT id, is_admin FROM users WHERE id = ?', (assigned_to,)).fetchone()
                 if not assigned_user:
-                    conn.close()
-                    return jsonify({'error': 'Assigned user not found'}), 400
+                    return {'error': 'Assigned user not found'}, 400
                 # If assigned to an admin, use 'admins' visibility unless it's private
                 if assigned_user['is_admin']:
                     if visibility == 'private':
@@ -1199,8 +2315,7 @@ def update_task(task_id):
         # Get parent task to check its current values
         parent_task = conn.execute('SELECT * FROM tasks WHERE id = ?', (parent_id,)).fetchone()
         if not parent_task:
-            conn.close()
-            return jsonify({'error': 'Parent task not found'}), 404
+            return {'error': 'Parent task not found'}, 404
         
         # Get the new values
         new_task_name = data.get('task', task['task'])
@@ -1209,8 +2324,7 @@ def update_task(task_id):
         
         # Validate: recurring tasks must have a date
         if recurrence and not new_date:
-            conn.close()
-            return jsonify({'error': 'Recurring tasks require a start date.'}), 400
+            return {'error': 'Recurring tasks require a start date.'}, 400
         
         # If updating an instance, update the parent and all instances
         if not is_parent:
@@ -1224,7 +2338,7 @@ def update_task(task_id):
                 WHERE id = ?
             ''', (new_task_name, new_time, visibility, assigned_to, parent_id))
             
-            # If recurrence changed, update parent's recurrence and regenerate instances
+            # If recurrence changed, update parent's recurrence and drop overrides of the old rule
             if recurrence != old_recurrence:
                 # Update parent's recurrence (keep parent's original date)
                 conn.execute('''
@@ -1233,20 +2347,11 @@ def update_task(task_id):
                     WHERE id = ?
                 ''', (recurrence, parent_id))
                 
-                # Delete all future instances
+                # Delete all future overrides, new occurrences are expanded from the rule
                 conn.execute('''
                     DELETE FROM tasks 
                     WHERE parent_task_id = ? AND date > ?
                 ''', (parent_id, datetime.now().strftime('%Y-%m-%d')))
-                
-                # Regenerate instances if recurrence is set
-                parent_date = parent_task['date'] if parent_task['date'] else None
-                if recurrence and parent_date:
-                    end_date = datetime.now() + timedelta(days=365)
-                    generate_recurring_instances(conn, parent_id, parent_date, recurrence, 
-                                               new_time,
-                                               parent_task['user_id'], parent_task['created_by'],
-                                               visibility, assigned_to, end_date)
             
             # Update all instances with new task name, time, visibility, assigned_to
             # (date is per-instance, recurrence is handled above)
@@ -1269,19 +2374,11 @@ def update_task(task_id):
             
             # Check if recurrence or date changed
             if (recurrence != old_recurrence) or (new_date != old_date and recurrence):
-                # Delete all future instances
+                # Delete all future overrides, new occurrences are expanded from the rule
                 conn.execute('''
                     DELETE FROM tasks 
                     WHERE parent_task_id = ? AND date > ?
                 ''', (parent_id, datetime.now().strftime('%Y-%m-%d')))
-                
-                # Regenerate instances if recurrence is set
-                if recurrence and new_date:
-                    end_date = datetime.now() + timedelta(days=365)
-                    generate_recurring_instances(conn, parent_id, new_date, recurrence, 
-                                               new_time,
-                                               task['user_id'], task['created_by'],
-                                               visibility, assigned_to, end_date)
             
             # Update parent task
             conn.execute('''
@@ -1298,28 +2395,32 @@ def update_task(task_id):
                 WHERE parent_task_id = ?
             ''', (new_task_name, new_time, visibility, assigned_to, parent_id))
     
-    conn.commit()
-    conn.close()
-    
-    return jsonify({'message': 'Task updated successfully'})
+    return {'message': 'Task updated successfully'}, 200
 
-@app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
+@app.route('/api/tasks/<int:task_id>', methods=['PUT'])
 @login_required
-def delete_task(task_id):
-    """Delete a task - only admins can delete"""
+@idempotent
+def update_task(task_id):
+    """Update a task - only admins can edit"""
     if not can_edit_tasks():
-        return jsonify({'error': 'Permission denied. Only admins can delete tasks.'}), 403
-    
-    # Get delete_all parameter from query string
-    delete_all = request.args.get('delete_all', 'false').lower() == 'true'
+        return jsonify({'error': 'Permission denied. Only admins can edit tasks.'}), 403
     
     conn = get_db()
-    
+    result, status = apply_update_task(conn, task_id, request.json, session['user_id'],
+                                       session.get('is_admin', False))
+    if status < 400:
+        conn.commit()
+    conn.close()
+    if status < 400:
+        publish_event('task_changed', {'task_id': task_id})
+    return jsonify(result), status
+
+def apply_delete_task(conn, task_id, delete_all):
+    """Delete a task on conn without committing; returns the response body and status"""
     # Verify task exists
     task = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
     if not task:
-        conn.close()
-        return jsonify({'error': 'Task not found'}), 404
+        return {'error': 'Task not found'}, 404
     
     # Determine if this is a parent task or an instance
     is_parent = (task['parent_task_id'] is None or task['parent_task_id'] == 0)
@@ -1343,18 +2444,122 @@ def delete_task(task_id):
             if instance_count > 0:
                 # Has instances - delete them too
                 conn.execute('DELETE FROM tasks WHERE parent_task_id = ?', (task_id,))
-        conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+            conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+        else:
+            # Keep the override as a cancelled exception so the rule doesn't bring it back
+            conn.execute('UPDATE tasks SET cancelled = 1 WHERE id = ?', (task_id,))
+    
+    return {'message': 'Task deleted successfully'}, 200
+
+@app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
+@login_required
+def delete_task(task_id):
+    """Delete a task - only admins can delete"""
+    if not can_edit_tasks():
+        return jsonify({'error': 'Permission denied. Only admins can delete tasks.'}), 403
+    
+    # Get delete_all parameter from query string
+    delete_all = request.args.get('delete_all', 'false').lower() == 'true'
+    
+    conn = get_db()
+    result, status = apply_delete_task(conn, task_id, delete_all)
+    if status < 400:
+        conn.commit()
+    conn.close()
+    if status < 400:
+        publish_event('task_changed', {'task_id': task_id})
+    return jsonify(result), status
+
+# Operations accepted in one /api/tasks/batch request
+BATCH_MAX_OPERATIONS = 200
+
+def apply_batch_operation(conn, operation, user_id, is_admin, can_edit):
+    """Apply one /api/tasks/batch operation on conn; returns the result body and status"""
+    if not isinstance(operation, dict):
+        return {'error': 'Each operation must be an object'}, 400
+    
+    op = operation.get('op')
+    if op == 'create':
+        task = operation.get('task')
+        if not isinstance(task, dict):
+            return {'error': 'task must be an object'}, 400
+        return apply_create_task(conn, task, user_id, is_admin)
+    if op not in ('update', 'complete', 'delete'):
+        return {'error': f'Unknown op: {op}'}, 400
+    
+    task_id = operation.get('id')
+    if not isinstance(task_id, int) or isinstance(task_id, bool):
+        return {'error': 'id must be a task id'}, 400
+    if not can_edit:
+        return {'error': 'Permission denied. Only admins can edit tasks.'}, 403
+    
+    if op == 'update':
+        task = operation.get('task')
+        if not isinstance(task, dict):
+            return {'error': 'task must be an object'}, 400
+        result, status = apply_update_task(conn, task_id, task, user_id, is_admin)
+    elif op == 'complete':
+        completed = {'completed': bool(operation.get('completed', True))}
+        result, status = apply_update_task(conn, task_id, completed, user_id, is_admin)
+    else:
+        result, status = apply_delete_task(conn, task_id, bool(operation.get('delete_all', False)))
+    
+    if status < 400:
+        result = {'id': task_id, **result}
+    return result, status
+
+@app.route('/api/tasks/batch', methods=['POST'])
+@login_required
+@idempotent
+def batch_tasks():
+    """Apply several task operations in one transaction.
+    
+    Operations are {"op": "create", "task": {...}}, {"op": "update", "id": ..., "task": {...}},
+    {"op": "complete", "id": ..., "completed": true} and {"op": "delete", "id": ..., "delete_all": false},
+    checked by the same rules as the single-task endpoints. Either all of them are applied or,
+    when one fails, none is: the results then end at the failing operation's error, with
+    every earlier one reported as rolled back (status 424, no id).
+    """
+    data = request.json or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({'error': f'At most {BATCH_MAX_OPERATIONS} operations per batch'}), 400
+    
+    user_id = session['user_id']
+    is_admin = session.get('is_admin', False)
+    can_edit = can_edit_tasks()
+    
+    conn = get_db()
+    results = []
+    for index, operation in enumerate(operations):
+        result, status = apply_batch_operation(conn, operation, user_id, is_admin, can_edit)
+        results.append({'index': index, 'status': status, **result})
+        if status >= 400:
+            conn.rollback()
+            conn.close()
+            # The earlier operations were undone too, so none of their ids exist any more
+            rolled_back = [{'index': earlier, 'status': 424,
+                            'error': f'Rolled back because operation {index} failed'}
+                           for earlier in range(index)]
+            return jsonify({
+                'error': f'Operation {index} failed, no changes were applied',
+                'results': rolled_back + results[-1:]
+            }), status
     
     conn.commit()
     conn.close()
+    publish_event('task_changed', {'task_ids': [result['id'] for result in results]})
     
-    return jsonify({'message': 'Task deleted successfully'})
+    return jsonify({'results': results})
 
 @app.route('/api/tasks/dates', methods=['GET'])
 @login_required
+@conditional_get
 def get_task_dates():
     """Get all dates that have tasks (including recurring instances) for calendar indicators"""
-    conn = get_db()
+    conn = get_db(readonly=True)
     user_id = session['user_id']
     is_admin = session.get('is_admin', False)
     
@@ -1362,113 +2567,120 @@ def get_task_dates():
     month = request.args.get('month')  # 0-11 (JavaScript month format)
     year = request.args.get('year')
     
-    # Calculate end date for instance generation
+    # Calculate the date window to report on
+    window_start = None
     if month is not None and year is not None:
         try:
             month_num = int(month)
             year_num = int(year)
-            # Get last day of the requested month
+            # Get first and last day of the requested month
             last_day = monthrange(year_num, month_num + 1)[1]
-            target_end_date = datetime(year_num, month_num + 1, last_day)
+            window_start = datetime(year_num, month_num + 1, 1)
+            window_end = datetime(year_num, month_num + 1, last_day)
         except:
-            target_end_date = datetime.now() + timedelta(days=365)
-    else:
-        # Default to 1 year ahead, but also check what dates we're actually querying
-        target_end_date = datetime.now() + timedelta(days=365)
+            window_start = None
+    if window_start is None:
+        # Default to the whole range recurring tasks are expanded for
+        window_end = datetime.now() + timedelta(days=RECURRENCE_HORIZON_DAYS)
     
-    # Ensure recurring instances exist for all parent tasks up to target date
-    parent_tasks = conn.execute('''
-        SELECT DISTINCT id FROM tasks 
-        WHERE recurrence IS NOT NULL AND parent_task_id IS NULL
-    ''').fetchall()
-    for parent in parent_tasks:
-        ensure_recurring_instances_exist(conn, parent['id'], target_end_date.strftime('%Y-%m-%d'))
-    conn.commit()
+    visibility_filter, params = get_visibility_filter(is_admin, user_id)
     
-    # Build visibility filter (same as get_tasks)
-    if is_admin:
-        visibility_filter = '''
-            ((visibility = 'all' AND assigned_to IS NULL) OR
-             (visibility = 'admins' AND assigned_to IS NULL) OR
-             (assigned_to IS NOT NULL AND assigned_to IN (SELECT id FROM users WHERE is_admin = 0)) OR
-             (assigned_to IS NOT NULL AND assigned_to IN (SELECT id FROM users WHERE is_admin = 1) AND visibility != 'private') OR
-             (visibility = 'private' AND created_by = ?) OR
-             (created_by IN (SELECT id FROM users WHERE is_admin = 0)))
-        '''
-        params = (user_id,)
+    # Get all dates from tasks (including overrides) that match visibility and are not completed
+    if window_start is not None:
+        date_range_filter = 'AND date BETWEEN ? AND ?'
+        date_params = (window_start.strftime('%Y-%m-%d'), window_end.strftime('%Y-%m-%d'))
     else:
-        visibility_filter = '''
-            ((visibility = 'all' AND assigned_to IS NULL AND created_by IN (SELECT id FROM users WHERE is_admin = 1)) OR 
-             assigned_to = ? OR 
-             (created_by = ? AND visibility != 'admins'))
-        '''
-        params = (user_id, user_id)
-    
-    # Get all dates from tasks (including instances) that match visibility and are not completed
+        date_range_filter = ''
+        date_params = ()
     dates = conn.execute(f'''
         SELECT DISTINCT date
         FROM tasks t
+        {TASK_USER_JOINS}
         WHERE date IS NOT NULL 
           AND completed = 0 
+          AND cancelled = 0
+          {date_range_filter}
           AND ({visibility_filter})
         ORDER BY date ASC
-    ''', params).fetchall()
+    ''', date_params + params).fetchall()
+    date_set = set(row['date'] for row in dates)
+    
+    # Add dates of recurring occurrences expanded from their rules
+    occurrences = expand_recurring_tasks(conn, visibility_filter, params,
+                                         window_start or datetime.min, window_end)
+    date_set.update(occurrence['date'] for occurrence in occurrences)
     
     conn.close()
     
     # Return just the date strings
-    date_list = [row['date'] for row in dates]
-    return jsonify(date_list)
+    return jsonify(sorted(date_set))
+
+@app.route('/api/calendar', methods=['GET'])
+@login_required
+@conditional_get
+def get_calendar_summary():
+    """Get per-day task counts for the 6-week grid shown for a month (month is 1-12)"""
+    year = request.args.get('year', type=int)
+    month = request.args.get('month', type=int)
+    if year is None or month is None or not 1 <= month <= 12 or not 1 <= year <= 9999:
+        return jsonify({'error': 'year and month (1-12) are required'}), 400
+    
+    conn = get_db(readonly=True)
+    user_id = session['user_id']
+    is_admin = session.get('is_admin', False)
+    visibility_filter, params = get_visibility_filter(is_admin, user_id)
+    
+    # The grid starts on the Sunday on or before the 1st and always shows 6 weeks
+    first_day = datetime(year, month, 1)
+    grid_start = first_day - timedelta(days=(first_day.weekday() + 1) % 7)
+    grid_end = grid_start + timedelta(days=41)
+    start_str = grid_start.strftime('%Y-%m-%d')
+    end_str = grid_end.strftime('%Y-%m-%d')
+    today_str = datetime.now().strftime('%Y-%m-%d')
+    
+    rows = conn.execute(f'''
+        SELECT t.date,
+               COUNT(*) as open_count,
+               SUM(t.date < ?) as overdue_count,
+               SUM(t.assigned_to IS NOT NULL AND t.assigned_to = ?) as assigned_count
+        FROM tasks t
+        {TASK_USER_JOINS}
+        WHERE t.date BETWEEN ? AND ? AND t.completed = 0 AND t.cancelled = 0
+          AND ({visibility_filter})
+        GROUP BY t.date
+    ''', (today_str, user_id, start_str, end_str) + params).fetchall()
+    
+    days = {}
+    for row in rows:
+        days[row['date']] = {
+            'open': row['open_count'],
+            'overdue': row['overdue_count'],
+            'assigned_to_me': row['assigned_count']
+        }
+    
+    # Add recurring occurrences expanded from their rules
+    for occurrence in expand_recurring_tasks(conn, visibility_filter, params, grid_start, grid_end):
+        day = days.setdefault(occurrence['date'], {'open': 0, 'overdue': 0, 'assigned_to_me': 0})
+        day['open'] += 1
+        if occurrence['date'] < today_str:
+            day['overdue'] += 1
+        if occurrence['assigned_to'] == user_id:
+            day['assigned_to_me'] += 1
+    conn.close()
+    
+    return jsonify({'start': start_str, 'end': end_str, 'days': days})
 
 @app.route('/api/tasks/date/<date>', methods=['GET'])
 @login_required
+@conditional_get
 def get_tasks_by_date(date):
     """Get tasks for a specific date"""
-    conn = get_db()
+    conn = get_db(readonly=True)
     user_id = session['user_id']
     is_admin = session.get('is_admin', False)
     
-    # Ensure recurring instances exist up to the requested date
-    # This ensures that if a user clicks on a date in the future, instances are generated
-    parent_tasks = conn.execute('''
-        SELECT DISTINCT id FROM tasks 
-        WHERE recurrence IS NOT NULL AND parent_task_id IS NULL
-    ''').fetchall()
-    for parent in parent_tasks:
-        ensure_recurring_instances_exist(conn, parent['id'], date)
-    conn.commit()
-    
-    # Build visibility filter
-    if is_admin:
-        # Admins see: 
-        # - Tasks with visibility='all' and not assigned (assigned to all users)
-        # - Tasks with visibility='admins' and not assigned (assigned to all admins)
-        # - Tasks assigned to non-admins
-        # - Tasks assigned to admins that are NOT private (visibility != 'private')
-        # - Their own private tasks (visibility='private' AND created_by = user_id)
-        # - All tasks created by regular users (to ensure admin oversight)
-        visibility_filter = '''
-            ((visibility = 'all' AND assigned_to IS NULL) OR
-             (visibility = 'admins' AND assigned_to IS NULL) OR
-             (assigned_to IS NOT NULL AND assigned_to IN (SELECT id FROM users WHERE is_admin = 0)) OR
-             (assigned_to IS NOT NULL AND assigned_to IN (SELECT id FROM users WHERE is_admin = 1) AND visibility != 'private') OR
-             (visibility = 'private' AND created_by = ?) OR
-             (created_by IN (SELECT id FROM users WHERE is_admin = 0)))
-        '''
-        params = (date, user_id)
-    else:
-        # Regular users see: 
-        # - Tasks with visibility='all' that are not assigned to anyone (global tasks, typically created by admins)
-        # - Tasks assigned to them
-        # - Tasks they created (their own tasks)
-        # They should NOT see tasks created by other non-admins unless assigned to them
-        # Note: Tasks created by non-admins should have assigned_to = created_by, so they won't match the first condition
-        visibility_filter = '''
-            ((visibility = 'all' AND assigned_to IS NULL AND created_by IN (SELECT id FROM users WHERE is_admin = 1)) OR 
-             assigned_to = ? OR 
-             (created_by = ? AND visibility != 'admins'))
-        '''
-        params = (date, user_id, user_id)
+    visibility_filter, params = get_visibility_filter(is_admin, user_id)
+    checklist_columns, checklist_join = get_checklist_summary_sql()
     
     tasks = conn.execute(f'''
         SELECT t.*, u.username as creator_username, u2.username as assigned_to_username,
@@ -1476,21 +2688,79 @@ def get_tasks_by_date(date):
                    SELECT 1 FROM task_completion_requests tcr 
                    WHERE tcr.task_id = t.id AND tcr.status = 'pending'
                ) THEN 1 ELSE 0 END as has_pending_request
+               {checklist_columns}
         FROM tasks t
-        LEFT JOIN users u ON t.created_by = u.id
-        LEFT JOIN users u2 ON t.assigned_to = u2.id
-        WHERE date = ? AND completed = 0 AND ({visibility_filter})
-        ORDER BY time ASC, created_at ASC
-    ''', params).fetchall()
+        {TASK_USER_JOINS}
+        {checklist_join}
+        WHERE date = ? AND completed = 0 AND cancelled = 0 AND ({visibility_filter})
+    ''', (date,) + params).fetchall()
+    tasks = [dict(task) for task in tasks]
+    
+    # Add recurring occurrences on this date that have no override row
+    try:
+        day = datetime.strptime(date, '%Y-%m-%d')
+        occurrences = expand_recurring_tasks(conn, visibility_filter, params, day, day)
+    except ValueError:
+        occurrences = []
+    if checklist_columns:
+        # Virtual occurrences have no row, so nothing can be attached to them yet
+        for occurrence in occurrences:
+            occurrence.update({'checklist_total': 0, 'checklist_completed': 0})
+    tasks.extend(occurrences)
+    conn.close()
+    
+    tasks.sort(key=lambda task: (task['time'] or '', task['created_at'] or ''))
+    return jsonify(tasks)
+
+@app.route('/api/tasks/<int:task_id>/occurrences/<occurrence_date>', methods=['POST'])
+@login_required
+def materialize_task_occurrence(task_id, occurrence_date):
+    """Create the override row for a virtual occurrence so it can be edited, completed or deleted"""
+    conn = get_db()
+    
+    parent_task = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+    if not parent_task or parent_task['parent_task_id'] or not parent_task['recurrence']:
+        conn.close()
+        return jsonify({'error': 'Recurring task not found'}), 404
+    
+    # Check visibility (same as get_checklist_items)
+    user_id = session['user_id']
+    is_admin = session.get('is_admin', False)
+    
+    can_access = False
+    if is_admin:
+        can_access = True
+    else:
+        if parent_task['assigned_to'] == user_id or parent_task['created_by'] == user_id:
+            can_access = True
+        elif parent_task['visibility'] == 'all' and parent_task['assigned_to'] is None:
+            can_access = True
+    
+    if not can_access:
+        conn.close()
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    try:
+        day = datetime.strptime(occurrence_date, '%Y-%m-%d')
+    except ValueError:
+        conn.close()
+        return jsonify({'error': 'Invalid date'}), 400
+    
+    if occurrence_date not in get_occurrence_dates(parent_task, day, day):
+        conn.close()
+        return jsonify({'error': 'Task does not recur on this date'}), 400
+    
+    occurrence_id = materialize_occurrence(conn, parent_task, occurrence_date)
+    conn.commit()
     conn.close()
     
-    return jsonify([dict(task) for task in tasks])
+    return jsonify({'id': occurrence_id})
 
 @app.route('/api/tasks/<int:task_id>/checklist', methods=['GET'])
 @login_required
 def get_checklist_items(task_id):
     """Get all checklist items for a task"""
-    conn = get_db()
+    conn = get_db(readonly=True)
     
     # Verify task exists and user can access it
     task = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
@@ -1568,11 +2838,13 @@ def create_checklist_item(task_id):
     conn.commit()
     item_id = cursor.lastrowid
     conn.close()
+    publish_event('task_changed', {'task_id': task_id})
     
     return jsonify({'id': item_id, 'message': 'Checklist item created successfully'}), 201
 
 @app.route('/api/checklist-items/<int:item_id>', methods=['PUT'])
 @login_required
+@idempotent
 def update_checklist_item(item_id):
     """Update a checklist item (text or completed status)"""
     data = request.json
@@ -1620,6 +2892,7 @@ def update_checklist_item(item_id):
     
     conn.commit()
     conn.close()
+    publish_event('task_changed', {'task_id': item['task_id']})
     
     return jsonify({'message': 'Checklist item updated successfully'})
 
@@ -1660,27 +2933,699 @@ def delete_checklist_item(item_id):
     conn.execute('DELETE FROM checklist_items WHERE id = ?', (item_id,))
     conn.commit()
     conn.close()
+    publish_event('task_changed', {'task_id': item['task_id']})
     
     return jsonify({'message': 'Checklist item deleted successfully'})
 
+# Formats of /api/export and the export-tasks command, and those that can be read back in
+EXPORT_FORMATS = ('jsonl', 'csv', 'ics')
+IMPORT_FORMATS = ('jsonl', 'csv')
+EXPORT_MIMETYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv', 'ics': 'text/calendar'}
+# Exported task columns; creator and assignee go by username so an export moves between installs
+# archived_at is set on tasks exported from the archive, and sends them back there on import
+TASK_EXPORT_COLUMNS = ('id', 'task', 'date', 'time', 'completed', 'completed_at', 'created_at',
+                       'visibility', 'recurrence', 'parent_task_id', 'occurrence_date', 'cancelled',
+                       'created_by', 'assigned_to', 'archived_at', 'checklist')
+# Rows written per transaction on import; one transaction per row would cap it at disk syncs per second
+IMPORT_CHUNK_SIZE = 1000
+# CSV rows and calendar lines buffered into each chunk of a streamed export
+EXPORT_STREAM_BATCH = 200
+# Domain part of event UIDs. It must not change, or calendar apps see every event as new,
+# so it is fixed rather than taken from the request's Host header
+CALENDAR_UID_HOST = os.environ.get('CALENDAR_UID_HOST', 'task-tracker')
+# RRULEs for the app's recurrences, see ical_rrule() for month-end clamping
+ICAL_RRULES = {
+    'daily': 'FREQ=DAILY',
+    'weekly': 'FREQ=WEEKLY',
+    'bi-weekly': 'FREQ=WEEKLY;INTERVAL=2',
+    'monthly': 'FREQ=MONTHLY',
+    'yearly': 'FREQ=YEARLY'
+}
+
+@lru_cache(maxsize=4096)
+def is_task_date(value):
+    """Whether a value is a valid YYYY-MM-DD date"""
+    if not isinstance(value, str) or len(value) != 10 or value[4] != '-' or value[7] != '-':
+        return False
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+def iter_tasks_with_checklists(conn, tasks):
+    """Attach checklist items to tasks ordered by id, merging two sorted reads instead of a query per task"""
+    items = conn.execute('''
+        SELECT task_id, item_text, completed, created_at FROM checklist_items
+        ORDER BY task_id, id
+    ''')
+    item = items.fetchone()
+    for row in tasks:
+        task = dict(row)
+        checklist = []
+        while item is not None and item['task_id'] < task['id']:
+            item = items.fetchone()
+        while item is not None and item['task_id'] == task['id']:
+            checklist.append({'item_text': item['item_text'], 'completed': item['completed'],
+                              'created_at': item['created_at']})
+            item = items.fetchone()
+        task['checklist'] = checklist
+        yield task
+
+def iter_export_tasks(conn):
+    """Yield every task, archived ones included, with creator and assignee usernames.
+    
+    Both tables are read in id order and merged, so overrides follow their series.
+    Archived tasks bring their checklist from the archive's JSON.
+    """
+    columns = '''
+        t.id as id, t.task, t.date, t.time, t.completed, t.completed_at, t.created_at,
+        t.visibility, t.recurrence, t.parent_task_id, t.occurrence_date, t.cancelled,
+        u.username as created_by, u2.username as assigned_to
+    '''
+    tasks = conn.execute(f'''
+        SELECT {columns}, NULL as archived_at, NULL as archived_checklist
+        FROM tasks t
+        {TASK_USER_JOINS}
+        UNION ALL
+        SELECT {columns}, t.archived_at, t.checklist
+        FROM tasks_archive t
+        {TASK_USER_JOINS}
+        ORDER BY id
+    ''')
+    for task in iter_tasks_with_checklists(conn, tasks):
+        archived_checklist = task.pop('archived_checklist')
+        if task['archived_at']:
+            task['checklist'] = json.loads(archived_checklist or '[]')
+        yield task
+
+def ical_escape(text):
+    """Escape a TEXT property value"""
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def ical_line(line):
+    """Terminate a content line, folding it at 75 octets without splitting a character"""
+    encoded = line.encode('utf-8')
+    parts = []
+    while len(encoded) > 75:
+        size = 75 if not parts else 74
+        while encoded[size] & 0xC0 == 0x80:
+            size -= 1
+        parts.append(encoded[:size].decode('utf-8'))
+        encoded = encoded[size:]
+    parts.append(encoded.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+def ical_datetime(date_str, time_str):
+    """DATE or floating DATE-TIME value for a task's date and optional time"""
+    value = date_str.replace('-', '')
+    if time_str:
+        value += 'T' + time_str.replace(':', '')[:4] + '00'
+    return value
+
+def ical_date_property(name, date_str, time_str):
+    """Property line for a date, marked VALUE=DATE when the task has no time"""
+    value_type = '' if time_str else ';VALUE=DATE'
+    return f'{name}{value_type}:{ical_datetime(date_str, time_str)}'
+
+def ical_rrule(recurrence, start):
+    """RRULE for a recurrence starting on start.
+    
+    Monthly and yearly series keep their day but fall back to the last day of
+    shorter months, which BYSETPOS=-1 over the candidate days expresses.
+    """
+    rule = ICAL_RRULES.get(recurrence)
+    if rule and recurrence == 'monthly' and start.day > 28:
+        rule += ';BYMONTHDAY=' + ','.join(str(day) for day in range(28, start.day + 1)) + ';BYSETPOS=-1'
+    elif rule and recurrence == 'yearly' and (start.month, start.day) == (2, 29):
+        rule += ';BYMONTH=2;BYMONTHDAY=28,29;BYSETPOS=-1'
+    return rule
+
+def ical_event(task):
+    """Content lines of a VEVENT for a dated task.
+    
+    The task's date must be valid. Series carry their RRULE and an EXDATE per
+    cancelled occurrence (the task's 'exdates', comma separated); an override
+    shares its series' UID and names the occurrence it replaces in RECURRENCE-ID
+    (at the series' 'parent_time').
+    """
+    is_override = task['parent_task_id'] is not None and task['occurrence_date']
+    uid = task['parent_task_id'] if is_override else task['id']
+    created = (task['created_at'] or '').replace('-', '').replace(':', '').replace(' ', 'T')
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:task-{uid}@{CALENDAR_UID_HOST}',
+        f'DTSTAMP:{created or "19700101T000000"}Z',
+        ical_date_property('DTSTART', task['date'], task['time']),
+        'SUMMARY:' + ical_escape(task['task'])
+    ]
+    if task.get('checklist'):
+        description = '\n'.join(('[x] ' if item['completed'] else '[ ] ') + item['item_text']
+                                for item in task['checklist'])
+        lines.append('DESCRIPTION:' + ical_escape(description))
+    if is_override:
+        lines.append(ical_date_property('RECURRENCE-ID', task['occurrence_date'], task['parent_time']))
+    elif task['recurrence']:
+        rule = ical_rrule(task['recurrence'], parse_task_date(task['date']))
+        if rule:
+            lines.append('RRULE:' + rule)
+        for exdate in (task['exdates'] or '').split(','):
+            if exdate:
+                lines.append(ical_date_property('EXDATE', exdate, task['time']))
+    lines.append('END:VEVENT')
+    return lines
+
+def generate_ical(events, name):
+    """Stream a VCALENDAR around an iterable of VEVENT line lists"""
+    yield ''.join(ical_line(line) for line in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Task Tracker//EN',
+        'CALSCALE:GREGORIAN', 'X-WR-CALNAME:' + ical_escape(name)))
+    batch = []
+    for event in events:
+        batch.extend(ical_line(line) for line in event)
+        if len(batch) >= EXPORT_STREAM_BATCH:
+            yield ''.join(batch)
+            batch = []
+    batch.append(ical_line('END:VCALENDAR'))
+    yield ''.join(batch)
+
+def generate_task_calendar(conn, name, visibility_filter='1 = 1', params=()):
+    """Stream the dated tasks passing a visibility filter as a VCALENDAR, series as RRULEs"""
+    tasks = conn.execute(f'''
+        SELECT t.*, p.time as parent_time,
+               (SELECT group_concat(o.occurrence_date) FROM tasks o
+                WHERE o.parent_task_id = t.id AND o.cancelled = 1) as exdates
+        FROM tasks t
+        {TASK_USER_JOINS}
+        LEFT JOIN tasks p ON p.id = t.parent_task_id
+        WHERE t.date IS NOT NULL AND t.cancelled = 0
+          AND (t.parent_task_id IS NULL OR p.recurrence IS NOT NULL)
+          AND ({visibility_filter})
+        ORDER BY t.id
+    ''', params)
+    events = (ical_event(task) for task in iter_tasks_with_checklists(conn, tasks)
+              if is_task_date(task['date']))
+    return generate_ical(events, name)
+
+def generate_export(conn, fmt):
+    """Stream every task in the given export format, a chunk of rows at a time"""
+    if fmt == 'ics':
+        yield from generate_task_calendar(conn, 'Task Tracker')
+        return
+    if fmt == 'jsonl':
+        yield from stream_json_lines(iter_export_tasks(conn))
+        return
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(TASK_EXPORT_COLUMNS)
+    for count, task in enumerate(iter_export_tasks(conn), 1):
+        task['checklist'] = dumps_json(task['checklist']) if task['checklist'] else ''
+        writer.writerow([task[column] for column in TASK_EXPORT_COLUMNS])
+        if count % EXPORT_STREAM_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def read_import_records(lines, fmt):
+    """Yield (line number, record) for each task of a JSON Lines or CSV import"""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            # Empty cells are missing values; numbers and the checklist come back from text
+            record = {key: value for key, value in record.items() if key and value not in ('', None)}
+            for key in ('id', 'parent_task_id', 'completed', 'cancelled'):
+                if key in record:
+                    try:
+                        record[key] = int(record[key])
+                    except ValueError:
+                        raise ValueError(f'Line {reader.line_num}: {key} is not a number')
+            if 'checklist' in record:
+                try:
+                    record['checklist'] = json.loads(record['checklist'])
+                except ValueError:
+                    raise ValueError(f'Line {reader.line_num}: checklist is not valid JSON')
+            yield reader.line_num, record
+        return
+    
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f'Line {line_number}: invalid JSON')
+        if not isinstance(record, dict):
+            raise ValueError(f'Line {line_number}: expected an object')
+        yield line_number, record
+
+def import_text(record, key):
+    """A text field of an imported record, or None when it is missing or not text"""
+    value = record.get(key)
+    return value if isinstance(value, str) and value else None
+
+def import_tasks(conn, records, user_id, counts):
+    """Insert imported tasks and their checklist items in chunked transactions.
+    
+    Tasks get new ids, assigned up front so a whole chunk goes in with one
+    executemany; overrides and checklist items are pointed at the new ids.
+    Records with an archived_at go to tasks_archive, their checklist kept as JSON.
+    Creators and assignees are matched by username, tasks whose creator is
+    unknown here belong to user_id. Imported and skipped rows are added to counts
+    as each chunk commits, so they stay accurate when a ValueError from records
+    stops the import part way.
+    """
+    usernames = {row['username']: row['id'] for row in conn.execute('SELECT id, username FROM users')}
+    id_map = {}
+    occurrences = set()
+    recurrences = set(RECURRENCE_DAY_STEPS) | set(RECURRENCE_MONTH_STEPS)
+    records = iter(records)
+    
+    while True:
+        chunk = []
+        for _, record in records:
+            chunk.append(record)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                break
+        if not chunk:
+            return
+        
+        # Take the write lock first so the ids read here stay free until the commit
+        conn.execute('BEGIN IMMEDIATE')
+        next_id = conn.execute('''
+            SELECT MAX(IFNULL((SELECT MAX(id) FROM tasks), 0),
+                       IFNULL((SELECT MAX(id) FROM tasks_archive), 0),
+                       IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'tasks'), 0)) + 1
+        ''').fetchone()[0]
+        task_rows = []
+        archive_rows = []
+        item_rows = []
+        skipped = 0
+        for record in chunk:
+            text = import_text(record, 'task')
+            date = import_text(record, 'date')
+            if not text or not text.strip() or (date and not is_task_date(date)):
+                skipped += 1
+                continue
+            archived_at = import_text(record, 'archived_at')
+            parent_id = None
+            occurrence_date = import_text(record, 'occurrence_date')
+            if archived_at:
+                # Archived overrides are history and are kept even if their series is gone
+                parent_id = id_map.get(record.get('parent_task_id'))
+            elif record.get('parent_task_id') is not None:
+                parent_id = id_map.get(record['parent_task_id'])
+                # Overrides need their series, and only one per occurrence
+                if parent_id is None or (parent_id, occurrence_date) in occurrences:
+                    skipped += 1
+                    continue
+                occurrences.add((parent_id, occurrence_date))
+            
+            task_id = next_id
+            next_id += 1
+            if record.get('id') is not None:
+                id_map[record['id']] = task_id
+            created_by = usernames.get(record.get('created_by'), user_id)
+            completed = 1 if record.get('completed') else 0
+            # The completed list pages on completed_at, so a completed task needs one
+            completed_at = import_text(record, 'completed_at') if completed else None
+            if completed and not completed_at:
+                completed_at = import_text(record, 'created_at') or datetime.now().isoformat()
+            recurrence = record.get('recurrence') if record.get('recurrence') in recurrences else None
+            visibility = record.get('visibility') if record.get('visibility') in ('all', 'admins', 'private') else 'all'
+            row = (
+                task_id, text, date, import_text(record, 'time'),
+                completed, completed_at, import_text(record, 'created_at'),
+                created_by, created_by, visibility, usernames.get(record.get('assigned_to')),
+                recurrence if date else None, parent_id, occurrence_date if parent_id else None,
+                1 if parent_id and record.get('cancelled') else 0
+            )
+            checklist = record.get('checklist')
+            items = [
+                (item['item_text'], 1 if item.get('completed') else 0, import_text(item, 'created_at'))
+                for item in (checklist if isinstance(checklist, list) else ())
+                if isinstance(item, dict) and (import_text(item, 'item_text') or '').strip()
+            ]
+            if archived_at:
+                archive_rows.append(row + (dumps_json([
+                    {'item_text': item_text, 'completed': done, 'created_at': created}
+                    for item_text, done, created in items
+                ]), archived_at))
+            else:
+                task_rows.append(row)
+                item_rows.extend((task_id,) + item for item in items)
+        
+        # Items go in ahead of their tasks (foreign keys are checked at commit), so the
+        # search trigger indexes each task once with its checklist rather than per item
+        conn.execute('PRAGMA defer_foreign_keys = ON')
+        conn.executemany('''
+            INSERT INTO checklist_items (task_id, item_text, completed, created_at)
+            VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ''', item_rows)
+        conn.executemany('''
+            INSERT INTO tasks (id, task, date, time, completed, completed_at, created_at, user_id, created_by,
+                               visibility, assigned_to, recurrence, parent_task_id, occurrence_date, cancelled)
+            VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', task_rows)
+        conn.executemany(f'''
+            INSERT INTO tasks_archive ({ARCHIVE_COLUMNS}, checklist, archived_at)
+            VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', archive_rows)
+        if archive_rows:
+            # Archived ids are task ids too; move the sequence past them so no new task reuses one
+            conn.execute('''
+                INSERT INTO sqlite_sequence (name, seq) SELECT 'tasks', 0
+                WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'tasks')
+            ''')
+            conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'tasks'", (next_id - 1,))
+        conn.commit()
+        counts['tasks'] += len(task_rows)
+        counts['archived'] += len(archive_rows)
+        counts['checklist_items'] += len(item_rows)
+        counts['skipped'] += skipped
+
+def import_format(fmt, filename):
+    """Import format from an explicit choice or the file name, defaulting to JSON Lines"""
+    if fmt:
+        return fmt
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return 'jsonl'
+
+@app.route('/api/export', methods=['GET'])
+@admin_required
+def export_tasks():
+    """Download every task with its checklist as JSON Lines, CSV or iCalendar, streamed as it is read.
+    
+    JSON Lines and CSV include the archive and import back in full; iCalendar has
+    the current tasks only.
+    """
+    fmt = request.args.get('format', 'jsonl')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(EXPORT_FORMATS)}'}), 400
+    
+    filename = f'tasks-{datetime.now().strftime("%Y%m%d")}.{fmt}'
+    return stream_read_only_response(lambda conn: generate_export(conn, fmt),
+                                     EXPORT_MIMETYPES[fmt],
+                                     {'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/api/import', methods=['POST'])
+@admin_required
+def import_tasks_upload():
+    """Import tasks from a JSON Lines or CSV request body, read as it arrives.
+    
+    The format comes from ?format=, else a text/csv content type, else JSON Lines.
+    """
+    fmt = request.args.get('format')
+    if fmt is None and request.mimetype == 'text/csv':
+        fmt = 'csv'
+    fmt = import_format(fmt, None)
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(IMPORT_FORMATS)}'}), 400
+    
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    conn = connect_db()
+    counts = {'tasks': 0, 'archived': 0, 'checklist_items': 0, 'skipped': 0}
+    try:
+        import_tasks(conn, read_import_records(lines, fmt), session['user_id'], counts)
+    except ValueError as e:
+        conn.rollback()
+        conn.close()
+        # Chunks before the bad line are committed; report them so the rest can be resent
+        return jsonify({'error': str(e), 'imported': counts}), 400
+    conn.close()
+    if counts['tasks'] or counts['archived']:
+        publish_event('task_changed', {'imported': counts['tasks']})
+    return jsonify({'message': 'Import complete', 'imported': counts})
+
+@app.cli.command('export-tasks')
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='jsonl', help='Output format.')
+@click.argument('output', type=click.File('w', encoding='utf-8', lazy=True), default='-')
+def export_tasks_command(fmt, output):
+    """Write every task, archived ones included, with checklists and recurrence rules, to OUTPUT (default: stdout).
+
+    The ics format has current tasks only.
+    """
+    init_db()
+    conn = connect_db()
+    try:
+        for chunk in generate_export(conn, fmt):
+            output.write(chunk)
+    finally:
+        conn.close()
+
+@app.cli.command('import-tasks')
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='Input format. Defaults to csv for .csv files, otherwise jsonl.')
+@click.option('--owner', required=True, help='Username owning tasks whose creator does not exist here.')
+@click.argument('input_file', type=click.File('r', encoding='utf-8-sig'))
+def import_tasks_command(fmt, owner, input_file):
+    """Import tasks from a JSON Lines or CSV export in INPUT_FILE (- for stdin)."""
+    init_db()
+    conn = connect_db()
+    try:
+        user = conn.execute('SELECT id FROM users WHERE username = ?', (owner,)).fetchone()
+        if not user:
+            raise click.BadParameter(f'no user named {owner}', param_hint='--owner')
+        counts = {'tasks': 0, 'archived': 0, 'checklist_items': 0, 'skipped': 0}
+        started = time.perf_counter()
+        records = read_import_records(input_file, import_format(fmt, input_file.name))
+        try:
+            import_tasks(conn, records, user['id'], counts)
+        except ValueError as e:
+            conn.rollback()
+            raise click.ClickException(f"{e} ({counts['tasks']} tasks imported before it)")
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - started
+    click.echo(f"Imported {counts['tasks']} tasks, {counts['archived']} archived tasks and "
+               f"{counts['checklist_items']} checklist items ({counts['skipped']} skipped) in {elapsed:.1f}s")
+
+# Feed bodies by (user id, role), each with the data version it was built at
+_calendar_feeds = {}
+
+def get_calendar_feed_url(token):
+    """Absolute URL of a user's calendar feed"""
+    return url_for('calendar_feed', token=token, _external=True)
+
+@app.route('/api/calendar-feed', methods=['GET'])
+@login_required
+def get_calendar_feed():
+    """Get the URL of the current user's calendar feed, or None if they have not created one"""
+    conn = get_db(readonly=True)
+    user = conn.execute('SELECT calendar_token FROM users WHERE id = ?', (session['user_id'],)).fetchone()
+    conn.close()
+    token = user['calendar_token'] if user else None
+    return jsonify({'url': get_calendar_feed_url(token) if token else None})
+
+@app.route('/api/calendar-feed', methods=['POST'])
+@login_required
+def reset_calendar_feed():
+    """Create the current user's calendar feed URL, revoking any earlier one"""
+    token = secrets.token_urlsafe(24)
+    conn = get_db()
+    conn.execute('UPDATE users SET calendar_token = ? WHERE id = ?', (token, session['user_id']))
+    conn.commit()
+    conn.close()
+    return jsonify({'url': get_calendar_feed_url(token)})
+
+@app.route('/calendar/<token>.ics', methods=['GET'])
+def calendar_feed(token):
+    """Read-only iCalendar feed of the tasks a user can see, authorized by the token in its URL.
+    
+    Calendar apps poll this without a session. Recurring tasks are sent as RRULEs
+    and the body is only rebuilt once the data version moves; until then a poll
+    costs one indexed lookup and is answered from memory, or with a 304 when the
+    app sends back the ETag.
+    """
+    conn = get_db(readonly=True)
+    user = conn.execute('''
+        SELECT u.id, u.username, u.is_admin, dv.version
+        FROM users u, data_version dv
+        WHERE u.calendar_token = ? AND dv.id = 1
+    ''', (token,)).fetchone()
+    if not user:
+        conn.close()
+        return jsonify({'error': 'Calendar not found'}), 404
+    
+    is_admin = bool(user['is_admin'])
+    feed = _calendar_feeds.get((user['id'], is_admin))
+    if feed is None or feed[0] != user['version']:
+        visibility_filter, params = get_visibility_filter(is_admin, user['id'])
+        calendar = generate_task_calendar(conn, f"Tasks ({user['username']})", visibility_filter, params)
+        body = ''.join(calendar).encode('utf-8')
+        # Tagged by content, so a rebuild after a change elsewhere still answers 304
+        feed = (user['version'], hashlib.sha256(body).hexdigest()[:32], body)
+        _calendar_feeds[(user['id'], is_admin)] = feed
+    conn.close()
+    
+    response = Response(feed[2], mimetype='text/calendar')
+    response.set_etag(feed[1])
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+def create_scheduler():
+    """Create the scheduler for background jobs; it is started by start_scheduler()"""
+    scheduler = BackgroundScheduler()
+    
+    # Schedule weekly job to extend recurring instances (runs every Monday at 2 AM)
+    scheduler.add_job(
+        func=extend_recurring_instances_job,
+        trigger=CronTrigger(day_of_week='mon', hour=2, minute=0),
+        id='extend_recurring_instances',
+        name='Extend recurring task instances weekly',
+        replace_existing=True
+    )
+    
+    # Schedule retention cleanup of old completed tasks (runs hourly, off the request path)
+    scheduler.add_job(
+        func=cleanup_old_completed_tasks,
+        trigger=CronTrigger(minute=15),
+        id='cleanup_old_completed_tasks',
+        name='Remove old completed tasks hourly',
+        replace_existing=True
+    )
+    return scheduler
+
 # Initialize scheduler for background jobs
-scheduler = BackgroundScheduler()
-scheduler.start()
-
-# Schedule weekly job to extend recurring instances (runs every Monday at 2 AM)
-scheduler.add_job(
-    func=extend_recurring_instances_job,
-    trigger=CronTrigger(day_of_week='mon', hour=2, minute=0),
-    id='extend_recurring_instances',
-    name='Extend recurring task instances weekly',
-    replace_existing=True
-)
+scheduler = create_scheduler()
+
+# Only the process holding this lock runs background jobs, however many are serving
+SCHEDULER_LOCK_FILE = 'scheduler.lock'
+# Seconds between attempts of a non-leader process to take over the jobs
+SCHEDULER_LEADER_RETRY_SECONDS = 60
+_scheduler_lock = None
+
+def acquire_scheduler_lock():
+    """Try to become the scheduler leader by taking an exclusive lock held for the process's life"""
+    global _scheduler_lock
+    if _scheduler_lock is not None or fcntl is None:
+        return True
+    lock_file = open(SCHEDULER_LOCK_FILE, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _scheduler_lock = lock_file
+    return True
+
+def retry_scheduler_later():
+    """Try to become the scheduler leader again after SCHEDULER_LEADER_RETRY_SECONDS"""
+    retry = threading.Timer(SCHEDULER_LEADER_RETRY_SECONDS, start_scheduler)
+    retry.daemon = True
+    retry.start()
+
+def start_scheduler():
+    """Start the background jobs if this process is the leader, otherwise retry later"""
+    if acquire_scheduler_lock():
+        if not scheduler.running:
+            scheduler.start()
+        return
+    # The leader's lock is released when it exits, so a surviving process takes over
+    retry_scheduler_later()
+
+def reset_scheduler_after_fork():
+    """Make a forked worker a non-leader that waits for the lock like any other process.
+    
+    Closing the inherited lock file only drops this process's reference, the parent
+    keeps the lock. The parent's scheduler is replaced, as its thread did not survive
+    the fork.
+    """
+    global scheduler, _scheduler_lock
+    if _scheduler_lock is not None:
+        _scheduler_lock.close()
+        _scheduler_lock = None
+    scheduler = create_scheduler()
+    retry_scheduler_later()
+
+# `flask serve` and `python app.py` start the scheduler themselves. Under another WSGI
+# server, RUN_SCHEDULER=1 starts it on import; the lock still keeps it to one process
+if os.environ.get('RUN_SCHEDULER') == '1':
+    start_scheduler()
 
 # Shutdown scheduler when app exits
-atexit.register(lambda: scheduler.shutdown())
+atexit.register(lambda: scheduler.shutdown() if scheduler.running else None)
+
+# Seconds between shared data version checks on event streams when serving with several workers
+EVENT_POLL_SECONDS = 5
+
+@app.cli.command('serve')
+@click.option('--host', default='0.0.0.0', help='Interface to listen on.')
+@click.option('--port', default=5001, type=int, help='Port to listen on.')
+@click.option('--workers', default=os.cpu_count() or 1, type=int,
+              help='Worker processes, each serving requests on threads. Defaults to the CPU count.')
+def serve_command(host, port, workers):
+    """Run the production server.
+
+    The listening socket is opened once and shared by pre-forked worker processes,
+    so requests use every core. This process only supervises the workers and, as
+    scheduler leader, runs the background jobs; if it dies, a worker takes them over.
+    """
+    init_db()
+    
+    server = make_server(host, port, app, threaded=True)
+    if workers <= 1 or not hasattr(os, 'fork'):
+        start_scheduler()
+        if scheduler.running:
+            extend_recurring_instances_job()
+        click.echo(f'Serving on http://{host}:{port}')
+        server.serve_forever()
+        return
+    
+    app.config['EVENT_POLL_SECONDS'] = EVENT_POLL_SECONDS
+    children = set()
+    
+    def spawn_worker():
+        pid = os.fork()
+        if pid == 0:
+            # Workers never return into the supervisor's code or run its exit handlers
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            reset_scheduler_after_fork()
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os._exit(0)
+        children.add(pid)
+    
+    # Turn SIGTERM into SystemExit so the workers are stopped on the way out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    for _ in range(workers):
+        spawn_worker()
+    start_scheduler()
+    if scheduler.running:
+        extend_recurring_instances_job()
+    click.echo(f'Serving on http://{host}:{port} with {workers} workers')
+    
+    try:
+        while True:
+            pid, _ = os.wait()
+            children.discard(pid)
+            # Replace a crashed worker, pausing so a failing one cannot spin
+            time.sleep(1)
+            spawn_worker()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
 
 if __name__ == '__main__':
     init_db()
+    start_scheduler()
     # Run the job once immediately on startup to extend any expiring instances
-    extend_recurring_instances_job()
+    if scheduler.running:
+        extend_recurring_instances_job()
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -18,7 +18,7 @@ source venv/bin/activate
 echo "Installing requirements..."
 pip install -r requirements.txt
 
-# Run the application
+# Run the application with the production server (one worker process per CPU core)
 echo "Starting server..."
-python app.py
+flask --app app serve
 
@@ -7,6 +7,13 @@ let currentUser = null;
 let isAdmin = false;
 let currentTaskFilter = 'all';
 let allTasks = []; // Store all tasks for filtering
+let syncCursor = null; // Change log position allTasks is up to date with
+let lastFetchedSyncCursor = null;
+let nextTasksCursor = null; // Cursor of the next page of the current list, null once it is all loaded
+let lastFetchedNextCursor = null;
+let historyTasks = []; // Archived tasks shown after the completed list
+let historyCursor = null; // Cursor of the next page of history, null once it is all loaded
+let historyLoaded = false;
 let currentChecklistTaskId = null; // Track which task's checklist is being edited
 
 const monthNames = [
@@ -15,6 +22,7 @@ const monthNames = [
 ];
 
 const dayNames = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"];
+const TASK_PAGE_SIZE = 100; // Tasks fetched per page of the task lists
 
 // Auto-resize textarea function
 function autoResizeTextarea(textarea) {
@@ -39,7 +47,6 @@ async function checkAuth() {
         
         if (isAdmin) {
             checkAccountRequests();
-            checkTaskCompletionRequests();
             loadUsers();
             setupAdminTaskFilter();
         }
@@ -90,7 +97,7 @@ function toggleTaskMenu(menu) {
     }
 }
 
-function attachCompleteSlider(slider, taskId) {
+function attachCompleteSlider(slider, onComplete) {
     let triggered = false;
 
     slider.addEventListener('input', () => {
@@ -99,7 +106,7 @@ function attachCompleteSlider(slider, taskId) {
             triggered = true;
             slider.value = 100;
             slider.disabled = true;
-            markTaskComplete(taskId, true);
+            onComplete();
         }
     });
 
@@ -125,13 +132,16 @@ document.addEventListener('click', function(event) {
     }
 });
 
+// Updates the admin notification with both pending account and task completion requests
 async function checkAccountRequests() {
     try {
-        const accountResponse = await fetch('/api/account-requests');
+        const [accountResponse, completionResponse] = await Promise.all([
+            fetch('/api/account-requests'),
+            fetch('/api/task-completion-requests')
+        ]);
         if (!accountResponse.ok) return;
         
         const accountRequests = await accountResponse.json();
-        const completionResponse = await fetch('/api/task-completion-requests');
         const completionRequests = completionResponse.ok ? await completionResponse.json() : [];
         
         await updateAdminNotification(accountRequests.length, completionRequests.length);
@@ -140,18 +150,47 @@ async function checkAccountRequests() {
     }
 }
 
-async function checkTaskCompletionRequests() {
-    try {
-        const response = await fetch('/api/task-completion-requests');
-        if (!response.ok) return;
-        
-        const requests = await response.json();
-        const accountResponse = await fetch('/api/account-requests');
-        const accountRequests = accountResponse.ok ? await accountResponse.json() : [];
+let syncTimer = null;
+
+// Coalesce a burst of change events into a single sync
+function scheduleSync() {
+    if (syncTimer) return;
+    syncTimer = setTimeout(() => {
+        syncTimer = null;
+        syncTasks();
         
-        await updateAdminNotification(accountRequests.length, requests.length);
-    } catch (error) {
-        console.error('Error checking task completion requests:', error);
+        const dayPopup = document.getElementById('day-popup');
+        if (dayPopup.classList.contains('show') && currentDayDateStr) {
+            showDayTasks(currentDayDateStr);
+        }
+    }, 250);
+}
+
+// Live updates pushed by the server instead of polling
+function connectEventStream() {
+    if (!('EventSource' in window)) {
+        return;
+    }
+    
+    const events = new EventSource('/api/events');
+    // Catch up on anything missed while disconnected (or served from the offline cache)
+    events.addEventListener('open', scheduleSync);
+    events.addEventListener('task_changed', scheduleSync);
+    
+    if (isAdmin) {
+        const dashboardIsOpen = () => document.getElementById('admin-dashboard').style.display !== 'none';
+        events.addEventListener('completion_request', () => {
+            checkAccountRequests();
+            if (dashboardIsOpen()) {
+                loadTaskCompletionRequests();
+            }
+        });
+        events.addEventListener('account_request', () => {
+            checkAccountRequests();
+            if (dashboardIsOpen()) {
+                loadAccountRequests();
+            }
+        });
     }
 }
 
@@ -206,6 +245,82 @@ function closeChangePasswordPopup() {
     successDiv.style.display = 'none';
 }
 
+async function openCalendarFeedPopup() {
+    const menu = document.getElementById('user-menu');
+    if (menu) {
+        menu.style.display = 'none';
+    }
+    const popup = document.getElementById('calendar-feed-popup');
+    const input = document.getElementById('calendar-feed-url');
+    document.getElementById('calendar-feed-error').style.display = 'none';
+    document.getElementById('calendar-feed-success').style.display = 'none';
+    input.value = '';
+    popup.classList.add('show');
+    
+    try {
+        const response = await fetch('/api/calendar-feed');
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Failed to load calendar address');
+        }
+        if (data.url) {
+            input.value = data.url;
+        } else {
+            // First visit: create the address
+            await resetCalendarFeed();
+        }
+    } catch (error) {
+        console.error('Error loading calendar feed:', error);
+        showCalendarFeedMessage('calendar-feed-error', 'Could not load the calendar address. Please try again.');
+    }
+}
+
+function closeCalendarFeedPopup() {
+    document.getElementById('calendar-feed-popup').classList.remove('show');
+}
+
+function showCalendarFeedMessage(elementId, message) {
+    document.getElementById('calendar-feed-error').style.display = 'none';
+    document.getElementById('calendar-feed-success').style.display = 'none';
+    const element = document.getElementById(elementId);
+    element.textContent = message;
+    element.style.display = 'block';
+}
+
+async function resetCalendarFeed() {
+    const input = document.getElementById('calendar-feed-url');
+    const hadAddress = input.value !== '';
+    try {
+        // A new address stops the old one from working
+        const response = await fetch('/api/calendar-feed', { method: 'POST' });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Failed to create calendar address');
+        }
+        input.value = data.url;
+        if (hadAddress) {
+            showCalendarFeedMessage('calendar-feed-success', 'New address created. The old one no longer works.');
+        }
+    } catch (error) {
+        console.error('Error resetting calendar feed:', error);
+        showCalendarFeedMessage('calendar-feed-error', 'Could not create a calendar address. Please try again.');
+    }
+}
+
+async function copyCalendarFeedUrl() {
+    const input = document.getElementById('calendar-feed-url');
+    if (!input.value) {
+        return;
+    }
+    try {
+        await navigator.clipboard.writeText(input.value);
+        showCalendarFeedMessage('calendar-feed-success', 'Address copied.');
+    } catch (error) {
+        // Clipboard access needs a secure context; leave the address selected to copy by hand
+        input.select();
+    }
+}
+
 async function handleChangePassword(event) {
     event.preventDefault();
     
@@ -307,7 +422,31 @@ async function registerServiceWorker() {
         await navigator.serviceWorker.register('/service-worker.js');
     } catch (error) {
         console.warn('Service worker registration failed:', error);
+        return;
+    }
+    
+    // Writes queued while offline are replayed by the service worker
+    navigator.serviceWorker.addEventListener('message', (event) => {
+        if (event.data && event.data.type === 'outbox-replayed') {
+            scheduleSync();
+        }
+    });
+    window.addEventListener('online', requestOutboxReplay);
+    requestOutboxReplay();
+}
+
+function requestOutboxReplay() {
+    if (navigator.serviceWorker && navigator.serviceWorker.controller) {
+        navigator.serviceWorker.controller.postMessage('replay-outbox');
+    }
+}
+
+// Lets the server recognise a retried write; the service worker queues these while offline
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
     }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
 }
 
 // Initialize on page load
@@ -320,6 +459,14 @@ document.addEventListener('DOMContentLoaded', async function() {
     
     renderCalendar();
     loadTasks();
+    connectEventStream();
+    
+    // Catch up with changes made on other devices when the app comes back to the foreground
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'visible') {
+            syncTasks();
+        }
+    });
     
     // Set up auto-resize for task input textarea
     const taskInput = document.getElementById('task-input');
@@ -407,23 +554,33 @@ function changeMonth(direction) {
 }
 
 async function updateCalendarTaskIndicators() {
-    // Fetch dates that have tasks (including recurring instances) for calendar
-    // Pass current month/year to ensure instances are generated for the viewed month
+    // Fetch per-day task counts (including recurring occurrences) for the visible month grid
     try {
-        const url = `/api/tasks/dates?month=${currentMonth}&year=${currentYear}`;
+        const url = `/api/calendar?year=${currentYear}&month=${currentMonth + 1}`;
         const response = await fetch(url);
-        const dates = await response.json();
-        const dateSet = new Set(dates);
+        const summary = await response.json();
+        const days = summary.days || {};
         
         document.querySelectorAll('.calendar-day').forEach(day => {
-            if (day.dataset.date && dateSet.has(day.dataset.date)) {
-                day.classList.add('has-tasks');
-            } else {
-                day.classList.remove('has-tasks');
+            const counts = day.dataset.date ? days[day.dataset.date] : null;
+            day.classList.toggle('has-tasks', Boolean(counts));
+            day.classList.toggle('has-overdue', Boolean(counts && counts.overdue));
+            day.classList.toggle('has-assigned', Boolean(counts && counts.assigned_to_me));
+            
+            let badge = day.querySelector('.calendar-day-count');
+            if (counts) {
+                if (!badge) {
+                    badge = document.createElement('span');
+                    badge.className = 'calendar-day-count';
+                    day.appendChild(badge);
+                }
+                badge.textContent = counts.open;
+            } else if (badge) {
+                badge.remove();
             }
         });
     } catch (error) {
-        console.error('Error fetching task dates for calendar:', error);
+        console.error('Error fetching calendar summary:', error);
         // Fallback to old method if new endpoint fails
         const tasks = await fetchTasks();
         const dateSet = new Set(tasks.filter(t => t.date).map(t => t.date));
@@ -438,10 +595,16 @@ async function updateCalendarTaskIndicators() {
     }
 }
 
-async function fetchTasks(showCompleted = false) {
+async function fetchTasks(showCompleted = false, cursor = null) {
     try {
-        const response = await fetch(`/api/tasks?completed=${showCompleted}`);
+        let url = `/api/tasks?completed=${showCompleted}&checklist_summary=true&limit=${TASK_PAGE_SIZE}`;
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+        const response = await fetch(url);
         const tasks = await response.json();
+        lastFetchedSyncCursor = response.headers.get('X-Sync-Cursor');
+        lastFetchedNextCursor = response.headers.get('X-Next-Cursor');
         return tasks;
     } catch (error) {
         console.error('Error fetching tasks:', error);
@@ -452,6 +615,8 @@ async function fetchTasks(showCompleted = false) {
 async function loadTasks() {
     const tasks = await fetchTasks(showingCompleted);
     allTasks = tasks; // Store all tasks
+    syncCursor = lastFetchedSyncCursor;
+    nextTasksCursor = lastFetchedNextCursor;
     
     if (showingCompleted) {
         displayCompletedTasks(tasks);
@@ -462,6 +627,67 @@ async function loadTasks() {
     }
 }
 
+// Append the next page of the current list
+async function loadMoreTasks() {
+    if (!nextTasksCursor) return;
+    
+    const tasks = await fetchTasks(showingCompleted, nextTasksCursor);
+    nextTasksCursor = lastFetchedNextCursor;
+    const loadedIds = new Set(allTasks.map(task => task.id));
+    allTasks.push(...tasks.filter(task => !loadedIds.has(task.id)));
+    applyTaskFilter();
+}
+
+function taskBelongsInCurrentList(task) {
+    if (task.parent_task_id || task.completed !== (showingCompleted ? 1 : 0)) {
+        return false;
+    }
+    // Tasks past the last loaded one arrive with their page instead
+    return !nextTasksCursor || allTasks.length === 0 ||
+        compareTasksForCurrentList(task, allTasks[allTasks.length - 1]) <= 0;
+}
+
+function compareTasksForCurrentList(a, b) {
+    // Same order as the server: completed by completed_at desc, others by date, time, created_at
+    if (showingCompleted) {
+        return (b.completed_at || '').localeCompare(a.completed_at || '') || b.id - a.id;
+    }
+    return (a.date || '').localeCompare(b.date || '') ||
+        (a.time || '').localeCompare(b.time || '') ||
+        (a.created_at || '').localeCompare(b.created_at || '') ||
+        a.id - b.id;
+}
+
+// Patch allTasks with the changes since the last load instead of refetching the whole list
+async function syncTasks() {
+    if (syncCursor === null) {
+        return loadTasks();
+    }
+    
+    try {
+        const response = await fetch(`/api/sync?since=${syncCursor}`);
+        if (!response.ok) return;
+        
+        const data = await response.json();
+        if (data.reset) {
+            return loadTasks();
+        }
+        
+        syncCursor = data.cursor;
+        if (data.tasks.length === 0 && data.removed.length === 0) {
+            return;
+        }
+        
+        const changedIds = new Set([...data.tasks.map(task => task.id), ...data.removed]);
+        allTasks = allTasks.filter(task => !changedIds.has(task.id));
+        allTasks.push(...data.tasks.filter(taskBelongsInCurrentList));
+        allTasks.sort(compareTasksForCurrentList);
+        applyTaskFilter();
+    } catch (error) {
+        console.error('Error syncing tasks:', error);
+    }
+}
+
 async function setupAdminTaskFilter() {
     const filterContainer = document.getElementById('admin-task-filter');
     const filterSelect = document.getElementById('task-filter-select');
@@ -496,9 +722,9 @@ async function setupAdminTaskFilter() {
 
 function applyTaskFilter() {
     const filterSelect = document.getElementById('task-filter-select');
-    if (!filterSelect) return;
-    
-    currentTaskFilter = filterSelect.value;
+    if (filterSelect) {
+        currentTaskFilter = filterSelect.value;
+    }
     
     if (showingCompleted) {
         displayCompletedTasks(allTasks);
@@ -573,6 +799,7 @@ function displayTasks(tasks) {
     renderTaskGroup('week-content', weekTasks);
     // All Other Tasks section shows only tasks not in Today or This Week
     renderTaskGroup('remaining-content', remainingTasks);
+    renderLoadMoreButton('remaining-content');
 }
 
 function displayCompletedTasks(tasks) {
@@ -584,12 +811,109 @@ function displayCompletedTasks(tasks) {
     
     if (filteredTasks.length === 0) {
         container.innerHTML = '<div class="empty-message">No completed tasks</div>';
-        return;
+    } else {
+        filteredTasks.forEach(task => {
+            container.appendChild(createTaskElement(task, true));
+        });
     }
-    
-    filteredTasks.forEach(task => {
-        container.appendChild(createTaskElement(task, true));
+    renderLoadMoreButton('completed-content');
+    if (!nextTasksCursor) {
+        renderHistory(container);
+    }
+}
+
+// Completed tasks older than a month are archived; their history follows the completed list
+function renderHistory(container) {
+    const filteredHistory = isAdmin ? applyTaskFilterToTasks(historyTasks) : historyTasks;
+    filteredHistory.forEach(task => {
+        container.appendChild(createHistoryTaskElement(task));
     });
+    if (historyLoaded && !historyCursor) return;
+    
+    const button = document.createElement('button');
+    button.className = 'btn-secondary btn-load-more';
+    button.textContent = historyLoaded ? 'Load more history' : 'Show older history';
+    button.onclick = () => {
+        button.disabled = true;
+        loadHistory();
+    };
+    container.appendChild(button);
+}
+
+async function loadHistory() {
+    try {
+        let url = `/api/history?limit=${TASK_PAGE_SIZE}`;
+        if (historyCursor) {
+            url += `&cursor=${encodeURIComponent(historyCursor)}`;
+        }
+        const response = await fetch(url);
+        if (!response.ok) {
+            throw new Error('Failed to load history');
+        }
+        historyTasks.push(...await response.json());
+        historyCursor = response.headers.get('X-Next-Cursor');
+        historyLoaded = true;
+    } catch (error) {
+        console.error('Error loading history:', error);
+    }
+    applyTaskFilter();
+}
+
+function resetHistory() {
+    historyTasks = [];
+    historyCursor = null;
+    historyLoaded = false;
+}
+
+// Archived tasks are read-only: no actions, and the checklist is shown as a count
+function createHistoryTaskElement(task) {
+    const taskDiv = document.createElement('div');
+    taskDiv.className = 'task-item task-archived';
+    
+    const taskInfo = document.createElement('div');
+    taskInfo.className = 'task-info';
+    
+    const title = document.createElement('div');
+    title.className = 'task-title';
+    title.textContent = task.task;
+    taskInfo.appendChild(title);
+    
+    const infoParts = [];
+    if (task.completed_at) {
+        const completedAt = new Date(task.completed_at.replace(' ', 'T'));
+        infoParts.push(`Completed ${completedAt.toLocaleDateString('en-US', { month: 'short', day: 'numeric', year: 'numeric' })}`);
+    }
+    if (task.creator_username) {
+        infoParts.push(`by ${task.creator_username}`);
+    }
+    if (task.assigned_to_username) {
+        infoParts.push(`assigned to ${task.assigned_to_username}`);
+    }
+    if (task.checklist.length > 0) {
+        const done = task.checklist.filter(item => item.completed).length;
+        infoParts.push(`${done}/${task.checklist.length} checklist items`);
+    }
+    
+    const meta = document.createElement('div');
+    meta.className = 'task-meta';
+    meta.textContent = infoParts.join(' • ');
+    taskInfo.appendChild(meta);
+    
+    taskDiv.appendChild(taskInfo);
+    return taskDiv;
+}
+
+function renderLoadMoreButton(containerId) {
+    if (!nextTasksCursor) return;
+    
+    const button = document.createElement('button');
+    button.className = 'btn-secondary btn-load-more';
+    button.textContent = 'Load more tasks';
+    button.onclick = () => {
+        button.disabled = true;
+        loadMoreTasks();
+    };
+    document.getElementById(containerId).appendChild(button);
 }
 
 function renderTaskGroup(containerId, tasks) {
@@ -606,10 +930,42 @@ function renderTaskGroup(containerId, tasks) {
     });
 }
 
+// Recurring occurrences are expanded on the server without a row of their own;
+// the override row is created the first time one is acted on
+async function resolveTaskId(task) {
+    if (task.id) {
+        return task.id;
+    }
+    
+    const response = await fetch(`/api/tasks/${task.parent_task_id}/occurrences/${task.occurrence_date}`, {
+        method: 'POST'
+    });
+    if (!response.ok) {
+        throw new Error('Failed to load task occurrence');
+    }
+    
+    const data = await response.json();
+    task.id = data.id;
+    task.is_virtual = 0;
+    return task.id;
+}
+
 function createTaskElement(task, isCompleted) {
     const taskDiv = document.createElement('div');
     taskDiv.className = 'task-item';
-    taskDiv.dataset.taskId = task.id;
+    taskDiv.dataset.taskId = task.id || '';
+    
+    // Wrap a task action so it always receives a real task id
+    const withTaskId = (action) => async () => {
+        try {
+            const taskId = await resolveTaskId(task);
+            taskDiv.dataset.taskId = taskId;
+            action(taskId);
+        } catch (error) {
+            console.error('Error resolving task:', error);
+            alert('Error updating task. Please try again.');
+        }
+    };
     
     const taskInfo = document.createElement('div');
     taskInfo.className = 'task-info';
@@ -674,8 +1030,12 @@ function createTaskElement(task, isCompleted) {
     taskInfo.appendChild(title);
     taskInfo.appendChild(meta);
     
-    // Load and display checklist if it exists
-    loadTaskChecklist(task.id, taskInfo);
+    // Display checklist link if it exists, using the counts embedded in the task list
+    if (task.checklist_total !== undefined) {
+        renderChecklistLink(task.id, taskInfo, task.checklist_completed, task.checklist_total);
+    } else if (task.id) {
+        loadTaskChecklist(task.id, taskInfo);
+    }
     
     const actions = document.createElement('div');
     actions.className = 'task-actions';
@@ -690,7 +1050,7 @@ function createTaskElement(task, isCompleted) {
             incompleteBtn.type = 'button';
             incompleteBtn.className = 'btn-action btn-incomplete';
             incompleteBtn.textContent = 'Mark Incomplete';
-            incompleteBtn.onclick = () => markTaskComplete(task.id, false);
+            incompleteBtn.onclick = withTaskId(taskId => markTaskComplete(taskId, false));
             desktopActions.appendChild(incompleteBtn);
 
             const mobileActions = document.createElement('div');
@@ -700,7 +1060,7 @@ function createTaskElement(task, isCompleted) {
             incompleteMobileBtn.type = 'button';
             incompleteMobileBtn.className = 'btn-action btn-incomplete';
             incompleteMobileBtn.textContent = 'Mark Incomplete';
-            incompleteMobileBtn.onclick = () => markTaskComplete(task.id, false);
+            incompleteMobileBtn.onclick = withTaskId(taskId => markTaskComplete(taskId, false));
             mobileActions.appendChild(incompleteMobileBtn);
 
             actions.classList.add('has-mobile');
@@ -712,19 +1072,19 @@ function createTaskElement(task, isCompleted) {
             editBtn.type = 'button';
             editBtn.className = 'btn-action btn-edit';
             editBtn.textContent = 'Edit';
-            editBtn.onclick = () => editTask(task);
+            editBtn.onclick = withTaskId(() => editTask(task));
             
             const deleteBtn = document.createElement('button');
             deleteBtn.type = 'button';
             deleteBtn.className = 'btn-action btn-delete';
             deleteBtn.textContent = 'Delete';
-            deleteBtn.onclick = () => deleteTask(task.id, task);
+            deleteBtn.onclick = withTaskId(taskId => deleteTask(taskId, task));
             
             const completeBtn = document.createElement('button');
             completeBtn.type = 'button';
             completeBtn.className = 'btn-action btn-complete';
             completeBtn.textContent = 'Complete';
-            completeBtn.onclick = () => markTaskComplete(task.id, true);
+            completeBtn.onclick = withTaskId(taskId => markTaskComplete(taskId, true));
 
             desktopActions.appendChild(deleteBtn);
             desktopActions.appendChild(editBtn);
@@ -746,7 +1106,7 @@ function createTaskElement(task, isCompleted) {
                     <path d="M9 6V4a1 1 0 0 1 1-1h4a1 1 0 0 1 1 1v2"/>
                 </svg>
             `;
-            deleteIconBtn.onclick = () => deleteTask(task.id, task);
+            deleteIconBtn.onclick = withTaskId(taskId => deleteTask(taskId, task));
 
             const editIconBtn = document.createElement('button');
             editIconBtn.type = 'button';
@@ -758,7 +1118,7 @@ function createTaskElement(task, isCompleted) {
                     <path d="M16.5 3.5a2.1 2.1 0 0 1 3 3L7 19l-4 1 1-4 12.5-12.5z"/>
                 </svg>
             `;
-            editIconBtn.onclick = () => editTask(task);
+            editIconBtn.onclick = withTaskId(() => editTask(task));
 
             mobileActions.appendChild(deleteIconBtn);
             mobileActions.appendChild(editIconBtn);
@@ -777,7 +1137,7 @@ function createTaskElement(task, isCompleted) {
             sliderWrap.appendChild(slider);
             mobileActions.appendChild(sliderWrap);
 
-            attachCompleteSlider(slider, task.id);
+            attachCompleteSlider(slider, withTaskId(taskId => markTaskComplete(taskId, true)));
 
             actions.classList.add('has-mobile');
             actions.appendChild(mobileActions);
@@ -795,7 +1155,7 @@ function createTaskElement(task, isCompleted) {
                 requestCompleteBtn.style.cursor = 'not-allowed';
             } else {
                 requestCompleteBtn.textContent = 'Mark Complete';
-                requestCompleteBtn.onclick = () => requestTaskComplete(task.id);
+                requestCompleteBtn.onclick = withTaskId(taskId => requestTaskComplete(taskId));
             }
             
             desktopActions.appendChild(requestCompleteBtn);
@@ -1022,7 +1382,7 @@ async function markTaskComplete(taskId, completed) {
     try {
         const response = await fetch(`/api/tasks/${taskId}`, {
             method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': newIdempotencyKey() },
             body: JSON.stringify({ completed })
         });
 
@@ -1038,6 +1398,13 @@ async function markTaskComplete(taskId, completed) {
             }
         }
 
+        if (response.status === 202) {
+            // Queued while offline: the task leaves the current list now, the server catches up later
+            allTasks = allTasks.filter(task => task.id !== taskId);
+            applyTaskFilter();
+            return;
+        }
+
         loadTasks();
     } catch (error) {
         console.error('Error updating task:', error);
@@ -1150,6 +1517,7 @@ async function executeDelete(taskId, deleteAll) {
 
 function toggleCompletedTasks() {
     showingCompleted = !showingCompleted;
+    resetHistory();
     const btn = document.getElementById('show-completed-btn');
     const completedContainer = document.getElementById('completed-tasks-container');
     const tasksContainer = document.getElementById('tasks-container');
@@ -1167,6 +1535,61 @@ function toggleCompletedTasks() {
     loadTasks();
 }
 
+let searchTimer = null;
+
+// Search as the user types; the regular lists come back when the box is cleared
+function handleTaskSearch() {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(runTaskSearch, 200);
+}
+
+async function runTaskSearch() {
+    const query = document.getElementById('task-search-input').value.trim();
+    const resultsContainer = document.getElementById('search-results-container');
+    
+    if (!query) {
+        resultsContainer.style.display = 'none';
+        document.getElementById('tasks-container').style.display = showingCompleted ? 'none' : 'block';
+        document.getElementById('completed-tasks-container').style.display = showingCompleted ? 'block' : 'none';
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/api/search?q=${encodeURIComponent(query)}`);
+        if (!response.ok) return;
+        const tasks = await response.json();
+        
+        // Ignore results for a query the user has already typed past
+        if (document.getElementById('task-search-input').value.trim() !== query) return;
+        
+        document.getElementById('tasks-container').style.display = 'none';
+        document.getElementById('completed-tasks-container').style.display = 'none';
+        resultsContainer.style.display = 'block';
+        
+        const container = document.getElementById('search-results-content');
+        container.innerHTML = '';
+        if (tasks.length === 0) {
+            container.innerHTML = '<div class="empty-message">No matching tasks</div>';
+            return;
+        }
+        
+        tasks.forEach(task => {
+            const taskElement = createTaskElement(task, task.completed === 1);
+            // The server escapes the text and only adds <mark> tags around matches
+            taskElement.querySelector('.task-title').innerHTML = task.task_highlight;
+            if (task.checklist_snippet) {
+                const snippet = document.createElement('div');
+                snippet.className = 'search-snippet';
+                snippet.innerHTML = task.checklist_snippet;
+                taskElement.querySelector('.task-info').appendChild(snippet);
+            }
+            container.appendChild(taskElement);
+        });
+    } catch (error) {
+        console.error('Error searching tasks:', error);
+    }
+}
+
 // Store the current day's date for the Add Task button
 let currentDayDateStr = null;
 
@@ -1175,7 +1598,7 @@ async function showDayTasks(dateStr) {
         // Store the date string for the Add Task button
         currentDayDateStr = dateStr;
         
-        const response = await fetch(`/api/tasks/date/${dateStr}`);
+        const response = await fetch(`/api/tasks/date/${dateStr}?checklist_summary=true`);
         const tasks = await response.json();
         
         const popup = document.getElementById('day-popup');
@@ -1854,7 +2277,7 @@ async function toggleChecklistItem(itemId, completed) {
     try {
         const response = await fetch(`/api/checklist-items/${itemId}`, {
             method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': newIdempotencyKey() },
             body: JSON.stringify({ completed })
         });
         
@@ -1863,6 +2286,11 @@ async function toggleChecklistItem(itemId, completed) {
             return;
         }
         
+        // Queued while offline; the checkbox already shows the new state
+        if (response.status === 202) {
+            return;
+        }
+        
         // Reload to update UI
         if (currentChecklistTaskId) {
             await loadChecklistItems(currentChecklistTaskId);
@@ -1905,34 +2333,36 @@ async function loadTaskChecklist(taskId, container) {
         }
         
         const items = await response.json();
-        if (items.length === 0) {
-            return; // No items to display
-        }
-        
-        const checklistLink = document.createElement('div');
-        checklistLink.className = 'task-checklist-link';
-        
         const completedCount = items.filter(i => i.completed === 1).length;
-        const totalCount = items.length;
-        
-        const link = document.createElement('a');
-        link.href = '#';
-        link.className = 'checklist-link';
-        link.textContent = `📋 View List (${completedCount}/${totalCount})`;
-        link.onclick = (e) => {
-            e.preventDefault();
-            currentChecklistTaskId = taskId;
-            document.getElementById('checklist-popup-title').textContent = 'Attach List';
-            loadChecklistItems(taskId).then(() => {
-                document.getElementById('checklist-popup').classList.add('show');
-            });
-        };
-        
-        checklistLink.appendChild(link);
-        container.appendChild(checklistLink);
+        renderChecklistLink(taskId, container, completedCount, items.length);
     } catch (error) {
         console.error('Error loading task checklist:', error);
     }
 }
 
+function renderChecklistLink(taskId, container, completedCount, totalCount) {
+    if (!totalCount) {
+        return; // No items to display
+    }
+    
+    const checklistLink = document.createElement('div');
+    checklistLink.className = 'task-checklist-link';
+    
+    const link = document.createElement('a');
+    link.href = '#';
+    link.className = 'checklist-link';
+    link.textContent = `📋 View List (${completedCount}/${totalCount})`;
+    link.onclick = (e) => {
+        e.preventDefault();
+        currentChecklistTaskId = taskId;
+        document.getElementById('checklist-popup-title').textContent = 'Attach List';
+        loadChecklistItems(taskId).then(() => {
+            document.getElementById('checklist-popup').classList.add('show');
+        });
+    };
+    
+    checklistLink.appendChild(link);
+    container.appendChild(checklistLink);
+}
+
 
@@ -1,70 +0,0 @@
-const CACHE_NAME = 'task-tracker-v1';
-const APP_SHELL = [
-    '/',
-    '/static/style.css',
-    '/static/script.js',
-    '/static/manifest.json',
-    '/static/apple-touch-icon.png',
-    '/static/icon.svg'
-];
-
-self.addEventListener('install', (event) => {
-    event.waitUntil(
-        caches.open(CACHE_NAME).then((cache) => cache.addAll(APP_SHELL))
-    );
-    self.skipWaiting();
-});
-
-self.addEventListener('activate', (event) => {
-    event.waitUntil(
-        caches.keys().then((keys) =>
-            Promise.all(
-                keys
-                    .filter((key) => key !== CACHE_NAME)
-                    .map((key) => caches.delete(key))
-            )
-        )
-    );
-    self.clients.claim();
-});
-
-self.addEventListener('fetch', (event) => {
-    const { request } = event;
-    if (request.method !== 'GET') {
-        return;
-    }
-
-    const url = new URL(request.url);
-    if (url.origin !== self.location.origin) {
-        return;
-    }
-    if (url.pathname.startsWith('/api/')) {
-        return;
-    }
-
-    if (request.mode === 'navigate') {
-        event.respondWith(
-            fetch(request)
-                .then((response) => {
-                    const copy = response.clone();
-                    caches.open(CACHE_NAME).then((cache) => cache.put(request, copy));
-                    return response;
-                })
-                .catch(() => caches.match('/'))
-        );
-        return;
-    }
-
-    event.respondWith(
-        caches.match(request).then((cached) => {
-            if (cached) {
-                return cached;
-            }
-            return fetch(request).then((response) => {
-                const copy = response.clone();
-                caches.open(CACHE_NAME).then((cache) => cache.put(request, copy));
-                return response;
-            });
-        })
-    );
-});
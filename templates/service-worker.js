@@ -0,0 +1,276 @@
+// Rendered by the server: the cache name changes with the static assets' content,
+// so a deploy installs a fresh cache and the activate step drops the old one
+const CACHE_NAME = 'task-tracker-{{ asset_version }}';
+const APP_SHELL = [
+    '/',
+    '{{ url_for('static', filename='style.css') }}',
+    '{{ url_for('static', filename='script.js') }}',
+    '{{ url_for('static', filename='manifest.json') }}',
+    '{{ url_for('static', filename='apple-touch-icon.png') }}',
+    '{{ url_for('static', filename='icon.svg') }}'
+];
+
+// Task reads kept for offline use; online they always come from the network, so a
+// read right after a write never gets the pre-write copy
+const API_CACHE_NAME = 'task-tracker-api';
+const CACHED_API_PATHS = [
+    /^\/api\/tasks$/,
+    /^\/api\/tasks\/dates$/,
+    /^\/api\/tasks\/date\/[^/]+$/,
+    /^\/api\/calendar$/
+];
+
+// Writes sent with an Idempotency-Key (task completions, checklist toggles) are
+// queued here while offline and replayed in order once the server is reachable
+const OUTBOX_DB_NAME = 'task-tracker-outbox';
+const OUTBOX_STORE = 'requests';
+const QUEUED_WRITE_PATHS = [
+    /^\/api\/tasks\/\d+$/,
+    /^\/api\/checklist-items\/\d+$/
+];
+const OUTBOX_SYNC_TAG = 'replay-outbox';
+// Id of the user the queued writes belong to: they are sent once that user logs in
+// again, and dropped if someone else does
+const SESSION_STORE = 'session';
+const SESSION_USER_KEY = 'user';
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(
+        caches.open(CACHE_NAME).then((cache) => cache.addAll(APP_SHELL))
+    );
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', (event) => {
+    // API responses are dropped too, since their shape may change with a deploy
+    event.waitUntil(
+        caches.keys().then((keys) =>
+            Promise.all(
+                keys
+                    .filter((key) => key !== CACHE_NAME)
+                    .map((key) => caches.delete(key))
+            )
+        ).then(() => replayOutbox())
+    );
+    self.clients.claim();
+});
+
+self.addEventListener('sync', (event) => {
+    if (event.tag === OUTBOX_SYNC_TAG) {
+        event.waitUntil(replayOutbox());
+    }
+});
+
+self.addEventListener('message', (event) => {
+    if (event.data === OUTBOX_SYNC_TAG) {
+        event.waitUntil(replayOutbox());
+    }
+});
+
+self.addEventListener('fetch', (event) => {
+    const { request } = event;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+
+    if (url.pathname.startsWith('/api/')) {
+        handleApiRequest(event, request, url);
+        return;
+    }
+    if (request.method !== 'GET') {
+        return;
+    }
+
+    if (request.mode === 'navigate') {
+        event.respondWith(
+            fetch(request)
+                .then((response) => {
+                    const copy = response.clone();
+                    caches.open(CACHE_NAME).then((cache) => cache.put(request, copy));
+                    return response;
+                })
+                .catch(() => caches.match('/'))
+        );
+        return;
+    }
+
+    event.respondWith(
+        caches.match(request).then((cached) => {
+            if (cached) {
+                return cached;
+            }
+            return fetch(request).then((response) => {
+                const copy = response.clone();
+                caches.open(CACHE_NAME).then((cache) => cache.put(request, copy));
+                return response;
+            });
+        })
+    );
+});
+
+function handleApiRequest(event, request, url) {
+    if (url.pathname === '/api/auth/login') {
+        event.respondWith(login(event, request));
+        return;
+    }
+    if (url.pathname === '/api/auth/logout') {
+        event.respondWith(logout(request));
+        return;
+    }
+
+    if (request.method === 'GET' && CACHED_API_PATHS.some((path) => path.test(url.pathname))) {
+        event.respondWith(networkFirst(event, request));
+        return;
+    }
+
+    if (request.method === 'PUT' && request.headers.has('Idempotency-Key') &&
+        QUEUED_WRITE_PATHS.some((path) => path.test(url.pathname))) {
+        event.respondWith(sendOrQueue(request));
+    }
+}
+
+async function login(event, request) {
+    const response = await fetch(request);
+    if (!response.ok) {
+        return response;
+    }
+    const { user } = await response.clone().json();
+    const owner = await outboxTransaction('readonly', (store) => store.get(SESSION_USER_KEY), SESSION_STORE);
+    // Cached tasks may belong to whoever was logged in before
+    await caches.delete(API_CACHE_NAME);
+    if (owner === user.id) {
+        event.waitUntil(replayOutbox());
+    } else {
+        // Never send another user's queued writes with this session
+        await outboxTransaction('readwrite', (store) => store.clear());
+        await outboxTransaction('readwrite', (store) => store.put(user.id, SESSION_USER_KEY), SESSION_STORE);
+    }
+    return response;
+}
+
+async function logout(request) {
+    // Send the leaving user's queued writes while their session is still valid; what
+    // cannot be sent now waits for their next login
+    await replayOutbox().catch(() => {});
+    await caches.delete(API_CACHE_NAME);
+    return fetch(request);
+}
+
+async function networkFirst(event, request) {
+    const cache = await caches.open(API_CACHE_NAME);
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            event.waitUntil(cache.put(request, response.clone()));
+        }
+        return response;
+    } catch (error) {
+        // Offline: the last copy read, or the network error if there is none
+        const cached = await cache.match(request);
+        if (cached) {
+            return cached;
+        }
+        throw error;
+    }
+}
+
+async function sendOrQueue(request) {
+    const copy = request.clone();
+    try {
+        return await fetch(request);
+    } catch (error) {
+        const entry = {
+            url: copy.url,
+            method: copy.method,
+            headers: {
+                'Content-Type': copy.headers.get('Content-Type'),
+                'Idempotency-Key': copy.headers.get('Idempotency-Key')
+            },
+            body: await copy.text()
+        };
+        await outboxTransaction('readwrite', (store) => store.add(entry));
+        if (self.registration.sync) {
+            self.registration.sync.register(OUTBOX_SYNC_TAG).catch(() => {});
+        }
+        // 202 tells the page the write was queued rather than applied
+        return new Response(JSON.stringify({ queued: true }), {
+            status: 202,
+            headers: { 'Content-Type': 'application/json' }
+        });
+    }
+}
+
+let replaying = null;
+
+function replayOutbox() {
+    // One replay at a time, so queued writes are sent once and in order
+    if (!replaying) {
+        replaying = sendQueuedWrites().finally(() => {
+            replaying = null;
+        });
+    }
+    return replaying;
+}
+
+async function sendQueuedWrites() {
+    const entries = await outboxTransaction('readonly', (store) => store.getAll());
+    let sent = 0;
+    for (const entry of entries) {
+        let response;
+        try {
+            response = await fetch(entry.url, {
+                method: entry.method,
+                headers: entry.headers,
+                body: entry.body,
+                credentials: 'same-origin'
+            });
+        } catch (error) {
+            break; // Still offline; keep this and later writes for the next attempt
+        }
+        if (response.status >= 500 || response.status === 401) {
+            break; // Kept for when the server recovers or the session is renewed by a login
+        }
+        // Applied, answered from its idempotency key, or rejected for good
+        await outboxTransaction('readwrite', (store) => store.delete(entry.id));
+        sent += 1;
+    }
+
+    if (sent > 0) {
+        const clients = await self.clients.matchAll();
+        clients.forEach((client) => client.postMessage({ type: 'outbox-replayed' }));
+    }
+}
+
+function openOutbox() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open(OUTBOX_DB_NAME, 2);
+        open.onupgradeneeded = () => {
+            const db = open.result;
+            if (!db.objectStoreNames.contains(OUTBOX_STORE)) {
+                db.createObjectStore(OUTBOX_STORE, { keyPath: 'id', autoIncrement: true });
+            }
+            if (!db.objectStoreNames.contains(SESSION_STORE)) {
+                db.createObjectStore(SESSION_STORE);
+            }
+        };
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+async function outboxTransaction(mode, action, storeName = OUTBOX_STORE) {
+    const db = await openOutbox();
+    const transaction = db.transaction(storeName, mode);
+    const request = action(transaction.objectStore(storeName));
+    return new Promise((resolve, reject) => {
+        transaction.oncomplete = () => {
+            db.close();
+            resolve(request.result);
+        };
+        transaction.onerror = () => {
+            db.close();
+            reject(transaction.error);
+        };
+    });
+}
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'secret1'
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """The app module, imported in a scratch directory and backed by a fresh database"""
+    workdir = tmp_path_factory.mktemp('app')
+    cwd = os.getcwd()
+    # Importing the app writes its secret key and scheduler lock to the working directory
+    os.chdir(workdir)
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    app.DATABASE = str(workdir / 'tasks.db')
+    app.init_db()
+    return app
+
+
+@pytest.fixture(scope='session')
+def clients(app_module):
+    """Test clients logged in as an admin (the first user) and as an approved regular user"""
+    admin = app_module.app.test_client()
+    response = admin.post('/api/auth/register', json={'username': 'admin', 'password': PASSWORD})
+    assert response.status_code == 201, response.get_json()
+
+    user = app_module.app.test_client()
+    user.post('/api/auth/register', json={'username': 'user', 'password': PASSWORD})
+    request_id = admin.get('/api/account-requests').get_json()[0]['id']
+    admin.post(f'/api/account-requests/{request_id}', json={'action': 'approve_user'})
+    response = user.post('/api/auth/login', json={'username': 'user', 'password': PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return admin, user
@@ -0,0 +1,111 @@
+"""The hot task queries must seek their index rather than scan the tasks table"""
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def tasks(app_module, clients):
+    """A few plain tasks, a completed one and a weekly series starting today"""
+    admin, _ = clients
+    today = date.today().isoformat()
+    for i in range(5):
+        response = admin.post('/api/tasks', json={'task': f'Task {i}', 'date': today, 'visibility': 'all'})
+        assert response.status_code == 201, response.get_json()
+    response = admin.post('/api/tasks', json={'task': 'Series', 'date': today, 'recurrence': 'weekly',
+                                              'visibility': 'all'})
+    assert response.status_code == 201, response.get_json()
+
+    conn = app_module.connect_db()
+    conn.execute("UPDATE tasks SET completed = 1, completed_at = datetime('now') WHERE task IN ('Task 0', 'Task 1')")
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def statements(app_module, monkeypatch):
+    """Every SQL statement the app runs while the test is active, with its parameters bound"""
+    executed = []
+    connect_db = app_module.connect_db
+
+    def traced_connect_db():
+        conn = connect_db()
+        conn.set_trace_callback(executed.append)
+        return conn
+
+    monkeypatch.setattr(app_module, 'connect_db', traced_connect_db)
+    return executed
+
+
+def query_plan(app_module, sql):
+    """The detail column of EXPLAIN QUERY PLAN for a statement"""
+    conn = sqlite3.connect(app_module.DATABASE)
+    plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+    conn.close()
+    return plan
+
+
+def plans_matching(app_module, statements, marker):
+    """The query plans of the distinct statements containing marker"""
+    matching = list(dict.fromkeys(sql for sql in statements if marker in ' '.join(sql.split())))
+    assert matching, f'no statement containing {marker!r} was run'
+    return [query_plan(app_module, sql) for sql in matching]
+
+
+def assert_searches(plan, index):
+    """Assert the tasks table is read through index and never scanned"""
+    assert any(step.startswith(f'SEARCH t USING INDEX {index} ') for step in plan), plan
+    assert not any(step.startswith('SCAN t') for step in plan), plan
+
+
+def get_all_pages(client, url):
+    """Fetch every page of a paged endpoint"""
+    response = client.get(url)
+    assert response.status_code == 200, response.get_json()
+    while 'X-Next-Cursor' in response.headers:
+        response = client.get(f"{url}&cursor={response.headers['X-Next-Cursor']}")
+        assert response.status_code == 200, response.get_json()
+
+
+@pytest.mark.parametrize('role', [0, 1], ids=['admin', 'user'])
+@pytest.mark.parametrize('completed, index', [
+    ('false', 'idx_tasks_list'),
+    ('true', 'idx_tasks_completed_at'),
+])
+def test_task_list_searches_list_index(app_module, clients, tasks, statements, role, completed, index):
+    client = clients[role]
+    get_all_pages(client, f'/api/tasks?completed={completed}&limit=1')
+    client.get(f'/api/tasks?completed={completed}')
+
+    plans = plans_matching(app_module, statements, 'AND (t.parent_task_id IS NULL)')
+    # The unpaged list, the first page and the pages after a cursor
+    assert len(plans) >= 3
+    for plan in plans:
+        assert_searches(plan, index)
+        assert 'USE TEMP B-TREE FOR ORDER BY' not in plan
+
+
+@pytest.mark.parametrize('role', [0, 1], ids=['admin', 'user'])
+def test_day_query_searches_date_index(app_module, clients, tasks, statements, role):
+    day = (date.today() + timedelta(days=7)).isoformat()
+    response = clients[role].get(f'/api/tasks/date/{day}')
+    assert response.status_code == 200
+    # The weekly series is expanded onto the day
+    assert any(task['is_virtual'] for task in response.get_json() if 'is_virtual' in task)
+
+    for plan in plans_matching(app_module, statements, 'WHERE date = '):
+        assert_searches(plan, 'idx_tasks_date')
+
+
+@pytest.mark.parametrize('role', [0, 1], ids=['admin', 'user'])
+def test_recurrence_expansion_searches_parent_index(app_module, clients, tasks, statements, role):
+    day = (date.today() + timedelta(days=7)).isoformat()
+    clients[role].get(f'/api/tasks/date/{day}')
+    clients[role].get('/api/tasks/dates')
+
+    for plan in plans_matching(app_module, statements, 'WHERE t.parent_task_id IS NULL AND t.recurrence IS NOT NULL'):
+        assert_searches(plan, 'idx_parent_task_id')
+    for plan in plans_matching(app_module, statements, 'WHERE parent_task_id IS NOT NULL AND occurrence_date BETWEEN'):
+        assert any('idx_occurrence_unique' in step for step in plan), plan
+        assert not any(step.startswith('SCAN') for step in plan), plan
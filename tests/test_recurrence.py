@@ -0,0 +1,112 @@
+"""The closed-form recurrence arithmetic against a plain step-by-step walk of the series"""
+import random
+from calendar import monthrange
+from datetime import datetime, timedelta
+
+import pytest
+
+RECURRENCES = ['daily', 'weekly', 'bi-weekly', 'monthly', 'yearly']
+
+
+def reference_dates(start_date, recurrence, window_start, window_end):
+    """Walk the series one occurrence at a time, as the app did before the closed form"""
+    dates = []
+    current = start_date
+    while current <= window_end:
+        if current >= window_start:
+            dates.append(current.strftime('%Y-%m-%d'))
+        if recurrence == 'daily':
+            current += timedelta(days=1)
+        elif recurrence == 'weekly':
+            current += timedelta(weeks=1)
+        elif recurrence == 'bi-weekly':
+            current += timedelta(weeks=2)
+        elif recurrence in ('monthly', 'yearly'):
+            # Step from the current month, but always aim for the series' original day
+            months = 1 if recurrence == 'monthly' else 12
+            year, month = divmod(current.year * 12 + current.month - 1 + months, 12)
+            month += 1
+            current = datetime(year, month, min(start_date.day, monthrange(year, month)[1]))
+        else:
+            break
+    return dates
+
+
+def random_date(rng, first, last):
+    return datetime.fromordinal(rng.randint(first.toordinal(), last.toordinal()))
+
+
+def test_matches_reference_walk(app_module):
+    rng = random.Random(20240229)
+    for _ in range(3000):
+        recurrence = rng.choice(RECURRENCES)
+        start = random_date(rng, datetime(1996, 1, 1), datetime(2030, 12, 31))
+        # Windows opening before, on and after the start, up to ten years into the series
+        window_start = start + timedelta(days=rng.randint(-400, 3650))
+        window_end = window_start + timedelta(days=rng.randint(-3, 800))
+        expected = reference_dates(start, recurrence, window_start, window_end)
+        actual = app_module.calculate_recurring_dates(start.strftime('%Y-%m-%d'), recurrence,
+                                                      window_end, window_start)
+        assert actual == expected, (start, recurrence, window_start, window_end)
+
+
+@pytest.mark.parametrize('recurrence', RECURRENCES)
+@pytest.mark.parametrize('start', [datetime(2024, 1, 31), datetime(2024, 2, 29), datetime(2023, 12, 30)])
+def test_nth_occurrence_matches_reference_walk(app_module, recurrence, start):
+    walked = reference_dates(start, recurrence, start, start + timedelta(days=366 * 9))
+    computed = [app_module.nth_occurrence(start, recurrence, n).strftime('%Y-%m-%d')
+                for n in range(len(walked))]
+    assert computed == walked
+
+
+@pytest.mark.parametrize('recurrence', RECURRENCES)
+def test_occurrence_range_brackets_the_window(app_module, recurrence):
+    start = datetime(2024, 1, 31)
+    window_start, window_end = datetime(2025, 3, 1), datetime(2025, 6, 30)
+    indices = app_module.occurrence_range(start, recurrence, window_start, window_end)
+    for n in indices:
+        assert window_start <= app_module.nth_occurrence(start, recurrence, n) <= window_end
+    if indices:
+        assert app_module.nth_occurrence(start, recurrence, indices[-1] + 1) > window_end
+        if indices[0] > 0:
+            assert app_module.nth_occurrence(start, recurrence, indices[0] - 1) < window_start
+
+
+def test_monthly_from_january_31_clamps_without_drifting(app_module):
+    dates = app_module.calculate_recurring_dates('2024-01-31', 'monthly', datetime(2024, 6, 30))
+    assert dates == ['2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30', '2024-05-31', '2024-06-30']
+
+
+def test_yearly_from_february_29_falls_back_to_february_28(app_module):
+    dates = app_module.calculate_recurring_dates('2024-02-29', 'yearly', datetime(2032, 12, 31))
+    assert dates == ['2024-02-29', '2025-02-28', '2026-02-28', '2027-02-28', '2028-02-29',
+                     '2029-02-28', '2030-02-28', '2031-02-28', '2032-02-29']
+
+
+def test_window_start_before_series_start(app_module):
+    dates = app_module.calculate_recurring_dates('2024-03-10', 'weekly', datetime(2024, 3, 31),
+                                                 datetime(2024, 1, 1))
+    assert dates == ['2024-03-10', '2024-03-17', '2024-03-24', '2024-03-31']
+
+
+def test_window_start_after_series_start(app_module):
+    dates = app_module.calculate_recurring_dates('2020-01-06', 'bi-weekly', datetime(2024, 3, 31),
+                                                 datetime(2024, 3, 1))
+    assert dates == ['2024-03-11', '2024-03-25']
+    dates = app_module.calculate_recurring_dates('2023-08-31', 'monthly', datetime(2024, 4, 30),
+                                                 datetime(2024, 2, 1))
+    assert dates == ['2024-02-29', '2024-03-31', '2024-04-30']
+
+
+@pytest.mark.parametrize('recurrence, window_start, window_end', [
+    # The window closes before it opens
+    ('daily', datetime(2024, 5, 2), datetime(2024, 5, 1)),
+    # The window ends before the series starts
+    ('weekly', datetime(2023, 1, 1), datetime(2023, 12, 31)),
+    # The window falls between two occurrences
+    ('monthly', datetime(2024, 2, 1), datetime(2024, 2, 28)),
+    ('yearly', datetime(2025, 2, 1), datetime(2026, 1, 30)),
+])
+def test_empty_window(app_module, recurrence, window_start, window_end):
+    dates = app_module.calculate_recurring_dates('2024-01-31', recurrence, window_end, window_start)
+    assert dates == []
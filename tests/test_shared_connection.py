@@ -0,0 +1,43 @@
+"""The per-request connection shared by a handler and the helpers it calls"""
+import sqlite3
+
+import pytest
+
+
+def task_names(app_module):
+    conn = sqlite3.connect(app_module.DATABASE)
+    names = {row[0] for row in conn.execute('SELECT task FROM tasks')}
+    conn.close()
+    return names
+
+
+def insert_task(conn, name):
+    conn.execute('INSERT INTO tasks (task, user_id, created_by) VALUES (?, 1, 1)', (name,))
+
+
+def test_helper_read_keeps_handler_transaction(app_module, clients):
+    with app_module.app.test_request_context():
+        conn = app_module.get_db()
+        insert_task(conn, 'before helper read')
+        # A user cache miss reads and closes through the shared connection
+        app_module.user_cache.invalidate(1)
+        assert app_module.user_cache.get(1)['username'] == 'admin'
+        insert_task(conn, 'after helper read')
+        conn.commit()
+        conn.close()
+    assert {'before helper read', 'after helper read'} <= task_names(app_module)
+
+
+def test_uncommitted_writes_are_discarded_at_teardown(app_module, clients):
+    with app_module.app.test_request_context():
+        conn = app_module.get_db()
+        insert_task(conn, 'never committed')
+        conn.close()
+    assert 'never committed' not in task_names(app_module)
+
+
+def test_read_only_request_cannot_write(app_module, clients):
+    with app_module.app.test_request_context():
+        conn = app_module.get_db(readonly=True)
+        with pytest.raises(sqlite3.OperationalError):
+            insert_task(conn, 'read only')